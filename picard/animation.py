@@ -0,0 +1,269 @@
+import pygame
+from typing import List, Tuple, Dict, Optional, Union, Callable, Any
+from .const import *
+from .base import State
+from .ui import Element
+
+
+def linear(t: float) -> float:
+    return t
+
+
+def ease_in(t: float) -> float:
+    return t * t
+
+
+def ease_out(t: float) -> float:
+    return 1 - (1 - t) * (1 - t)
+
+
+def ease_in_out(t: float) -> float:
+    return 2 * t * t if t < 0.5 else 1 - 2 * (1 - t) * (1 - t)
+
+
+def interpolate(start: Any, end: Any, t: float) -> Any:
+    if type(start) in [list, tuple]:
+        return type(start)(interpolate(a, b, t) for a, b in zip(start, end))
+    value = start + (end - start) * t
+    if type(start) == int and type(end) == int:
+        return round(value)
+    return value
+
+
+# Frames are keyed by (path, final size, colorkey) so every element showing
+# the same sprite at the same size shares one pre-scaled surface
+_frame_cache: Dict[Tuple, pygame.Surface] = {}
+
+
+def load_frame(
+    path: str,
+    scale_by: float = 1.0,
+    size: Optional[Tuple[int, int]] = None,
+    colorkey: Union[Tuple[int], None] = None,
+) -> pygame.Surface:
+    colorkey = tuple(colorkey) if colorkey else COLOR_BLACK
+    source_key = (path, None, colorkey)
+    if source_key not in _frame_cache:
+        source = pygame.image.load(path).convert()
+        source.set_colorkey(colorkey, pygame.RLEACCEL)
+        _frame_cache[source_key] = source
+    source = _frame_cache[source_key]
+
+    if size:
+        size = tuple(size)
+    else:
+        size = (round(source.get_width() * scale_by), round(source.get_height() * scale_by))
+    key = (path, size, colorkey)
+    if key not in _frame_cache:
+        if source.get_size() == size:
+            _frame_cache[key] = source
+        else:
+            frame = pygame.transform.scale(source, size)
+            frame.set_colorkey(colorkey, pygame.RLEACCEL)
+            _frame_cache[key] = frame
+    return _frame_cache[key]
+
+
+def load_frames(
+    paths: List[str],
+    scale_by: float = 1.0,
+    size: Optional[Tuple[int, int]] = None,
+    colorkey: Union[Tuple[int], None] = None,
+) -> List[pygame.Surface]:
+    return [load_frame(path, scale_by, size, colorkey) for path in paths]
+
+
+def clear_frame_cache():
+    _frame_cache.clear()
+
+
+def button_frames(size: str = 'Large', action: str = 'Press', variant: str = '01') -> List[str]:
+    return [f"assets/UI_Flat_Button_{size}_{action}_{variant}a{i}.png" for i in range(1, 5)]
+
+
+class Tween:
+    def __init__(
+        self,
+        target: Union[State, Callable[[Any], None]],
+        start: Any,
+        end: Any,
+        duration: float,
+        *,
+        easing: Callable[[float], float] = ease_in_out,
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.target = target
+        self.start = start
+        self.end = end
+        self.duration = duration
+        self.easing = easing
+        self.on_done = on_done
+        self.elapsed = 0.0
+        self.apply(start)
+
+
+    def apply(self, value: Any):
+        # State.set only flags a change when the value actually moved, so
+        # an eased value that rounds to the same pixel redraws nothing
+        if isinstance(self.target, State):
+            self.target.set(value)
+        else:
+            self.target(value)
+
+
+    def advance(self, dt: float) -> bool:
+        self.elapsed += dt
+        if self.duration <= 0 or self.elapsed >= self.duration:
+            self.apply(self.end)
+            if self.on_done:
+                self.on_done()
+            return False
+        self.apply(interpolate(self.start, self.end, self.easing(self.elapsed / self.duration)))
+        return True
+
+
+def slide(
+    element: Element,
+    dx: int,
+    dy: int,
+    duration: float,
+    *,
+    easing: Callable[[float], float] = ease_out,
+    on_done: Optional[Callable[[], None]] = None,
+) -> Tween:
+    return Tween(
+        lambda pos: element.move(*pos),
+        (element.x, element.y),
+        (element.x + dx, element.y + dy),
+        duration,
+        easing=easing,
+        on_done=on_done,
+    )
+
+
+class AnimatedElement(Element):
+    def __init__(
+        self,
+        x: int,
+        y: int,
+        width: int = 0,
+        height: int = 0,
+        *,
+        sequences: Dict[str, List[str]],
+        scale_by: float = 1.0,
+        fps: int = ANIMATION_FPS,
+        colorkey: Union[Tuple[int], None] = None,
+        focusable: bool = False,
+        opacity: Union[int, None] = None,
+    ) -> None:
+        super().__init__(x, y, width, height, colorkey=colorkey, focusable=focusable, background=None, opacity=opacity, init_image=False)
+        if not sequences:
+            raise ValueError('sequences must contain at least one frame sequence')
+        size = (width, height) if width and height else None
+        self.sequences: Dict[str, List[pygame.Surface]] = {
+            name: load_frames(paths, scale_by, size, colorkey) for name, paths in sequences.items()
+        }
+        self._sequence = State(next(iter(sequences)), self.all_states)
+        self._frame = State(0, self.all_states)
+        self.fps = fps
+        self.playing = False
+        self.loop = False
+        self.elapsed = 0.0
+        self.init_image()
+
+
+    @property
+    def sequence(self):
+        return self._sequence.value
+
+    @sequence.setter
+    def sequence(self, value: str):
+        if value not in self.sequences:
+            raise KeyError(f"Unknown sequence: {value}")
+        return self._sequence.set(value)
+
+    @property
+    def frame(self):
+        return self._frame.value
+
+    @frame.setter
+    def frame(self, value: int):
+        return self._frame.set(value)
+
+
+    def play(self, name: str, loop: bool = False):
+        self.sequence = name
+        self.frame = 0
+        self.elapsed = 0.0
+        self.loop = loop
+        self.playing = True
+
+
+    def stop(self):
+        self.playing = False
+
+
+    def advance(self, dt: float) -> bool:
+        if not self.playing:
+            return False
+        self.elapsed += dt
+        count = len(self.sequences[self.sequence])
+        index = int(self.elapsed * self.fps)
+        if index >= count:
+            if self.loop:
+                index %= count
+            else:
+                index = count - 1
+                self.playing = False
+        self.frame = index
+        return self.playing
+
+
+    def init_image(self):
+        self.rect = pygame.Rect(self.x, self.y, 0, 0)
+        self.render(True)
+
+
+    def render(self, force: bool = False):
+        if not force and not (self._sequence.changed or self._frame.changed or self._opacity.changed):
+            return
+
+        # Frames are shared through the cache: swap the reference, never rescale
+        self.updated = True
+        self.image = self.sequences[self._sequence.get()][self._frame.get()]
+        self.rect = self.image.get_rect(left=self.x, top=self.y)
+        opacity = self._opacity.get()
+        if opacity is not None:
+            self.image = self.image.copy()
+            self.image.set_alpha(opacity)
+        self.commit_states()
+
+
+class Animator:
+    def __init__(self) -> None:
+        self.animations: List[Union[Tween, AnimatedElement]] = []
+
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.animations)
+
+
+    def add(self, animation: Union[Tween, AnimatedElement]) -> Union[Tween, AnimatedElement]:
+        if animation not in self.animations:
+            self.animations.append(animation)
+        return animation
+
+
+    def play(self, element: AnimatedElement, name: str, loop: bool = False) -> AnimatedElement:
+        element.play(name, loop)
+        return self.add(element)
+
+
+    def cancel(self, animation: Union[Tween, AnimatedElement]):
+        if animation in self.animations:
+            self.animations.remove(animation)
+
+
+    def update(self, dt: float):
+        self.animations = [animation for animation in self.animations if animation.advance(dt)]
@@ -0,0 +1,176 @@
+import signal
+import pygame
+from typing import List, Tuple, Union, Optional
+from .const import *
+from .ui import Element, ImageElement, UIElement, TextElement, Window
+from .layout import Stack, Row, Grid, Spacer, Item
+from .animation import AnimatedElement, Animator, Tween, slide, button_frames
+from .base import State
+from .display import Display, FramebufferDisplay
+from .jobs import Job, JobQueue, Scheduler
+from .power import Governor, Policy
+
+
+class PiCardApp:
+    def __init__(
+        self, 
+        screen_size: Optional[Union[Tuple[int], List[int]]] = None,
+        fps: int = 30,
+        display: Optional[Display] = None,
+    ) -> None:
+        # Validate args
+        if display is None:
+            if type(screen_size) not in [list, tuple]:
+                raise TypeError(f"screen_size must be list or tuple, not {type(screen_size)}")
+            if len(screen_size) != 2:
+                raise ValueError(f"screen_size must be a list or tuple of (width, height) in pixels")
+        self.fps = fps
+        self.running = True
+        self.locked = False
+
+        self.header_left = State('PiCard')
+        self.header_right = State('Home')
+        self.header_hr = State(True)
+        self.footer_left = State('03:58')
+        self.footer_right = State('1.4G/1024G')
+        self.footer_hr = State(True)
+
+        # One job per card reader slot, restored from the last session
+        self.governor = Governor()
+        self.scheduler = Scheduler(JobQueue(), governor=self.governor)
+
+
+        # pygame
+        pygame.init()
+        self.display = display if display else Display(screen_size)
+        self.screen = self.display.surface
+        self.screen_size = self.display.size
+        self.clock = pygame.time.Clock()
+        self.animator = Animator()
+
+        self.font = pygame.font.SysFont("Arial", size=14)
+
+        self.window = Window('Home', (0, 0, *self.screen_size), layout=Stack(
+            Row(
+                TextElement(0, 0, text=self.header_left, font=self.font),
+                Spacer(),
+                TextElement(0, 0, text=self.header_right, font=self.font),
+            ),
+            Spacer(),
+            Row(
+                TextElement(0, 0, text=self.footer_left, font=self.font),
+                Spacer(),
+                TextElement(0, 0, text=self.footer_right, font=self.font),
+            ),
+            padding=(PADDING_TOP, PADDING_RIGHT, PADDING_BOTTOM, PADDING_LEFT),
+            align=ALIGN_STRETCH,
+        ))
+    
+
+    @property
+    def screen_w(self):
+        return self.screen_size[0]
+
+
+    @property
+    def screen_h(self):
+        return self.screen_size[1]
+
+
+    def stop(self, *args):
+        self.running = False
+
+
+    def run(self):
+        # The framebuffer backend gets no SDL input, so signals are its way out
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        self.governor.start()
+        self.scheduler.start()
+        self.render(True)
+        while self.running:
+            self.handle_events()
+            # TODO self.update()
+            self.render()
+            # Governor lowers the frame rate when hot or low on battery
+            fps = min(self.fps, self.governor.policy.fps)
+            self.animator.update(self.clock.tick(fps) / 1000)
+        self.scheduler.stop()
+        self.governor.stop()
+        self.display.close()
+        pygame.quit()
+    
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    self.running = False
+
+
+    def render(self, flip: bool = False):
+        self.window.update()
+        updated_rects = self.window.draw(self.screen, force=flip)
+        
+        if flip:
+            self.display.flip()
+        elif updated_rects:
+            self.display.update(updated_rects)
+
+
+
+class PiCardTest:
+    def __init__(self, is_dev: bool, fps: int) -> None:
+        self.running = True
+        pygame.init()
+        if is_dev:
+            self.screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
+        else:
+            self.screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        self.clock = pygame.time.Clock()
+        self.fps = fps
+        self.window = Window('Test', (0, 0, SCREEN_W, SCREEN_H), background=COLOR_SKYBLUE)
+        self.needs_flip = True
+
+        frame = ImageElement(10, 10, src="assets/UI_Flat_Frame_01_Lite.png")
+        self.window.add(frame)
+        
+        frame2 = UIElement(60, 10, 100, 80, src="assets/UI_Flat_Frame_01_Lite.png", scale_by=2, scale_boundary=(5, 4, 5, 4))
+        self.window.add(frame2, z=1)
+
+
+
+    def start(self):
+        pygame.display.flip()
+        while self.running:
+            self.handle_events()
+            self.update()
+            self.render()
+            self.clock.tick(self.fps)
+        
+        pygame.quit()
+
+    
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    self.running = False
+
+    
+    def update(self):
+        self.window.update()
+
+
+    def render(self):
+        updated_rects = self.window.draw(self.screen, force=self.needs_flip)
+        
+        if self.needs_flip:
+            pygame.display.flip()
+            self.needs_flip = False
+        elif updated_rects:
+            pygame.display.update(updated_rects)
@@ -0,0 +1,326 @@
+import os
+import json
+import zlib
+import time
+import struct
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Callable, Iterator, Deque
+from collections import deque
+from .const import *
+from .trace import PhaseTimer, PHASE_OPEN, PHASE_READ, PHASE_HASH, PHASE_COMPRESS, PHASE_WRITE, QUEUE_CHUNKS
+
+
+# Layout: MAGIC | chunk frames ... | zlib(json index) | trailer
+# Each member is a list of chunks (offset, stored length, raw length), so any
+# member can be listed or restored without touching the rest of the archive.
+MAGIC = b'PICARDA1'
+TRAILER = struct.Struct('<QQ8s')
+ARCHIVE_VERSION = 1
+
+
+def _compress_chunk(data: bytes, level: int) -> bytes:
+    return zlib.compress(data, level)
+
+
+def is_compressible(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() not in COMPRESSED_EXTS
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class ArchiveMember:
+    def __init__(
+        self,
+        name: str,
+        size: int = 0,
+        mtime: float = 0.0,
+        hash: Optional[str] = None,
+        compressed: bool = False,
+        chunks: Optional[List[List[int]]] = None,
+    ) -> None:
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.hash = hash
+        self.compressed = compressed
+        self.chunks: List[List[int]] = chunks if chunks is not None else []
+
+
+    @property
+    def stored_size(self) -> int:
+        return sum(chunk[1] for chunk in self.chunks)
+
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'size': self.size,
+            'mtime': self.mtime,
+            'hash': self.hash,
+            'compressed': self.compressed,
+            'chunks': self.chunks,
+        }
+
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'ArchiveMember':
+        return cls(d['name'], d['size'], d['mtime'], d['hash'], d['compressed'], d['chunks'])
+
+
+class ArchiveWriter:
+    def __init__(
+        self,
+        path: str,
+        *,
+        workers: int = COPY_WORKERS,
+        chunk_size: int = COPY_CHUNK_SIZE,
+        level: int = COMPRESS_LEVEL,
+        hash_algo: str = HASH_ALGO,
+    ) -> None:
+        self.path = path
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.level = level
+        self.hash_algo = hash_algo
+        self.members: List[ArchiveMember] = []
+        # Chunks waiting on the pool, oldest first. The window spans add() calls
+        # so a run of small files still keeps every worker busy; each chunk's
+        # offset is only recorded when it is written out.
+        self.pending: Deque = deque()
+        self.max_pending = max(1, workers * 2)
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        # Writers run inside job threads, and forking a threaded process can
+        # copy a held lock into the child; forkserver workers start clean
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('forkserver'),
+        ) if workers > 1 else None
+
+
+    def __enter__(self) -> 'ArchiveWriter':
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type:
+            self._drop_pending()
+        self.close()
+
+
+    def _drop_pending(self) -> None:
+        # Members still waiting on the pool are incomplete; leave them out of the index
+        incomplete = {id(item[2]) for item in self.pending}
+        self.members = [member for member in self.members if id(member) not in incomplete]
+        self.pending.clear()
+
+
+    def add(
+        self,
+        src: str,
+        name: str,
+        on_progress: Optional[Callable[[int], None]] = None,
+        timer: Optional[PhaseTimer] = None,
+    ) -> ArchiveMember:
+        timer = timer or PhaseTimer(None, 0)
+        t = time.perf_counter()
+        st = os.stat(src)
+        member = ArchiveMember(name, st.st_size, st.st_mtime, compressed=is_compressible(name))
+        digest = hashlib.new(self.hash_algo)
+
+        with open(src, 'rb') as f:
+            t = timer.add(PHASE_OPEN, t)
+            while True:
+                data = f.read(self.chunk_size)
+                t = timer.add(PHASE_READ, t, len(data))
+                if not data:
+                    break
+                digest.update(data)
+                t = timer.add(PHASE_HASH, t, len(data))
+                if member.compressed and self.pool:
+                    # Bounded so memory stays flat
+                    self.pending.append([self.pool.submit(_compress_chunk, data, self.level), data, member, on_progress, timer, False])
+                    if timer.tracer:
+                        timer.tracer.queue(QUEUE_CHUNKS, len(self.pending))
+                    # A loop, since max_pending can shrink while running
+                    while len(self.pending) >= self.max_pending:
+                        self._resolve()
+                elif member.compressed:
+                    stored = zlib.compress(data, self.level)
+                    timer.add(PHASE_COMPRESS, t, len(data))
+                    self._write_chunk(member, stored, data, on_progress, timer)
+                else:
+                    self._write_chunk(member, data, data, on_progress, timer)
+                t = time.perf_counter()
+        if self.pending and self.pending[-1][2] is member:
+            # Its last chunks are still compressing; the timer is flushed again once they're written
+            self.pending[-1][5] = True
+
+        member.hash = digest.hexdigest()
+        self.members.append(member)
+        # hash is final, but chunks may still be in flight until flush() or close()
+        return member
+
+
+    def _resolve(self) -> None:
+        # Only the time spent waiting on the pool shows up as compress time here
+        future, data, member, on_progress, timer, last = self.pending.popleft()
+        t = time.perf_counter()
+        stored = future.result()
+        timer.add(PHASE_COMPRESS, t, len(data))
+        self._write_chunk(member, stored, data, on_progress, timer)
+        if last:
+            timer.flush()
+
+
+    def flush(self) -> None:
+        # Writes out every chunk still in flight; members are complete afterwards
+        while self.pending:
+            self._resolve()
+
+
+    def _write_chunk(
+        self,
+        member: ArchiveMember,
+        stored: bytes,
+        raw: bytes,
+        on_progress: Optional[Callable[[int], None]],
+        timer: PhaseTimer,
+    ) -> None:
+        # Compressed frames that didn't shrink are stored raw (flagged by equal lengths)
+        if len(stored) >= len(raw):
+            stored = raw
+        t = time.perf_counter()
+        member.chunks.append([self.file.tell(), len(stored), len(raw)])
+        self.file.write(stored)
+        timer.add(PHASE_WRITE, t, len(stored))
+        if on_progress:
+            on_progress(len(raw))
+
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+        try:
+            self.flush()
+        except BaseException:
+            # e.g. a cancel raised from on_progress while draining
+            self._drop_pending()
+            raise
+        finally:
+            if self.pool:
+                self.pool.shutdown(cancel_futures=True)
+            index = zlib.compress(json.dumps({
+                'version': ARCHIVE_VERSION,
+                'hash_algo': self.hash_algo,
+                'members': [member.to_dict() for member in self.members],
+            }).encode('utf-8'))
+            index_offset = self.file.tell()
+            self.file.write(index)
+            self.file.write(TRAILER.pack(index_offset, len(index), MAGIC))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+
+class ArchiveReader:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = open(path, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ArchiveError(f"{path} is not a picard archive")
+
+        self.file.seek(-TRAILER.size, os.SEEK_END)
+        index_offset, index_length, magic = TRAILER.unpack(self.file.read(TRAILER.size))
+        if magic != MAGIC:
+            self.file.close()
+            raise ArchiveError(f"{path} is truncated or missing its index")
+
+        self.file.seek(index_offset)
+        index = json.loads(zlib.decompress(self.file.read(index_length)))
+        self.hash_algo: str = index['hash_algo']
+        self.members: Dict[str, ArchiveMember] = {}
+        for d in index['members']:
+            member = ArchiveMember.from_dict(d)
+            self.members[member.name] = member
+
+
+    def __enter__(self) -> 'ArchiveReader':
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+    def names(self) -> List[str]:
+        return list(self.members)
+
+
+    def getmember(self, name: str) -> ArchiveMember:
+        try:
+            return self.members[name]
+        except KeyError:
+            raise KeyError(f"{name} not found in {self.path}")
+
+
+    def iter_chunks(self, name: str) -> Iterator[bytes]:
+        # pread keeps reads independent of the shared file position, so
+        # several threads can restore from one reader at once
+        fd = self.file.fileno()
+        for offset, stored_len, raw_len in self.getmember(name).chunks:
+            data = os.pread(fd, stored_len, offset)
+            if len(data) != stored_len:
+                raise ArchiveError(f"{name}: short read at offset {offset}")
+            yield zlib.decompress(data) if stored_len != raw_len else data
+
+
+    def read(self, name: str) -> bytes:
+        return b''.join(self.iter_chunks(name))
+
+
+    def verify(self, name: str) -> bool:
+        digest = hashlib.new(self.hash_algo)
+        for data in self.iter_chunks(name):
+            digest.update(data)
+        return digest.hexdigest() == self.getmember(name).hash
+
+
+    def extract(
+        self,
+        name: str,
+        dst: str,
+        on_progress: Optional[Callable[[int], None]] = None,
+    ) -> str:
+        member = self.getmember(name)
+        os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+        tmp = dst + '.picard-tmp'
+        digest = hashlib.new(self.hash_algo)
+        try:
+            with open(tmp, 'wb') as f:
+                for data in self.iter_chunks(name):
+                    digest.update(data)
+                    f.write(data)
+                    if on_progress:
+                        on_progress(len(data))
+                f.flush()
+                os.fsync(f.fileno())
+
+            if digest.hexdigest() != member.hash:
+                raise ArchiveError(f"Verification failed for {name}")
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.utime(tmp, (member.mtime, member.mtime))
+        os.replace(tmp, dst)
+        return member.hash
+
+
+    def close(self) -> None:
+        self.file.close()
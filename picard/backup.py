@@ -0,0 +1,358 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Callable
+from .const import *
+from .archive import ArchiveWriter, ArchiveReader
+from .trace import Tracer, PhaseTimer, PHASE_OPEN, PHASE_READ, PHASE_HASH, PHASE_WRITE, PHASE_FSYNC, PHASE_VERIFY, PHASE_DELETE, QUEUE_FILES
+
+
+class BackupError(Exception):
+    pass
+
+
+class FileEntry:
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        mtime: float,
+        hash: Optional[str] = None,
+    ) -> None:
+        # path is relative to the backup root and always '/' separated
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.hash = hash
+
+
+    def to_dict(self) -> Dict:
+        return {'path': self.path, 'size': self.size, 'mtime': self.mtime, 'hash': self.hash}
+
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'FileEntry':
+        return cls(d['path'], d['size'], d['mtime'], d['hash'])
+
+
+def load_manifest(dest: str) -> Dict:
+    with open(os.path.join(dest, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def hash_file(path: str, hash_algo: str = HASH_ALGO, chunk_size: int = COPY_CHUNK_SIZE) -> str:
+    digest = hashlib.new(hash_algo)
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def copy_file(
+    src: str,
+    dst: str,
+    *,
+    hash_algo: str = HASH_ALGO,
+    chunk_size: int = COPY_CHUNK_SIZE,
+    expected: Optional[str] = None,
+    on_progress: Optional[Callable[[int], None]] = None,
+    timer: Optional[PhaseTimer] = None,
+) -> str:
+    # Write to a temp name and rename once synced and verified, so an
+    # interrupted copy never leaves a truncated file under the real name
+    timer = timer or PhaseTimer(None, 0)
+    t = time.perf_counter()
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    tmp = dst + '.picard-tmp'
+    digest = hashlib.new(hash_algo)
+    with open(src, 'rb') as fsrc:
+        try:
+            with open(tmp, 'wb') as fdst:
+                t = timer.add(PHASE_OPEN, t)
+                while True:
+                    data = fsrc.read(chunk_size)
+                    t = timer.add(PHASE_READ, t, len(data))
+                    if not data:
+                        break
+                    digest.update(data)
+                    t = timer.add(PHASE_HASH, t, len(data))
+                    fdst.write(data)
+                    t = timer.add(PHASE_WRITE, t, len(data))
+                    if on_progress:
+                        # May raise to cancel the copy
+                        on_progress(len(data))
+                        # Time spent paused or throttled by the caller isn't a copy phase
+                        t = time.perf_counter()
+                fdst.flush()
+                os.fsync(fdst.fileno())
+                t = timer.add(PHASE_FSYNC, t)
+
+            copied = digest.hexdigest()
+            verified = hash_file(tmp, hash_algo, chunk_size) == copied
+            timer.add(PHASE_VERIFY, t, os.path.getsize(tmp))
+            if not verified:
+                raise BackupError(f"Verification failed for {dst}")
+            # The source itself may be checked against a known hash, e.g. a manifest on restore
+            if expected is not None and copied != expected:
+                raise BackupError(f"{src} no longer matches its expected hash")
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+    st = os.stat(src)
+    os.utime(tmp, (st.st_atime, st.st_mtime))
+    os.replace(tmp, dst)
+    return copied
+
+
+class Backup:
+    def __init__(
+        self,
+        src: str,
+        dest: str,
+        *,
+        mode: int = MODE_COPY,
+        output: int = OUTPUT_DIR,
+        workers: int = COPY_WORKERS,
+        chunk_size: int = COPY_CHUNK_SIZE,
+        hash_algo: str = HASH_ALGO,
+        resume: bool = False,
+        tracer: Optional[Tracer] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> None:
+        if mode not in [MODE_COPY, MODE_COPY_AND_DEL, MODE_MOVE]:
+            raise ValueError(f"Unknown backup mode: {mode}")
+        if output not in [OUTPUT_DIR, OUTPUT_ARCHIVE]:
+            raise ValueError(f"Unknown backup output: {output}")
+        self.src = os.path.abspath(src)
+        self.dest = os.path.abspath(dest)
+        self.mode = mode
+        self.output = output
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.hash_algo = hash_algo
+        # Skips files already at the destination; archives always start over
+        self.resume = resume
+        self.tracer = tracer
+        self.on_progress = on_progress
+
+        self.entries: List[FileEntry] = []
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.files_started = 0
+        self._lock = threading.Lock()
+        # Set once any copy fails or is cancelled, so queued copies don't start
+        self._stopped = threading.Event()
+        # How many files may copy at once; throttle() lowers it while running
+        self.limit = workers
+        self._active = 0
+        self._gate = threading.Condition()
+        self._writer: Optional[ArchiveWriter] = None
+
+
+    def scan(self) -> List[FileEntry]:
+        start = time.perf_counter()
+        self.entries = []
+        for root, dirs, files in os.walk(self.src):
+            # Never back up into ourselves
+            dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != self.dest)
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                rel = os.path.relpath(path, self.src).replace(os.sep, '/')
+                self.entries.append(FileEntry(rel, st.st_size, st.st_mtime))
+        self.bytes_total = sum(entry.size for entry in self.entries)
+        self.bytes_done = 0
+        self.files_started = 0
+        if self.tracer:
+            self.tracer.event(
+                'scan',
+                files=len(self.entries),
+                bytes=self.bytes_total,
+                duration=time.perf_counter() - start,
+            )
+        return self.entries
+
+
+    def run(self) -> List[FileEntry]:
+        if not self.entries:
+            self.scan()
+        os.makedirs(self.dest, exist_ok=True)
+
+        if self.output == OUTPUT_ARCHIVE:
+            self._run_archive()
+        else:
+            self._run_dir()
+        self.write_manifest()
+
+        if self.mode != MODE_COPY:
+            self._delete_sources()
+        return self.entries
+
+
+    def throttle(self, workers: int, chunk_size: int) -> None:
+        # Applies to a running backup: at most `workers` files copy (or chunks
+        # compress) at once from now on, and reads use the new chunk size. The
+        # hash stays as it was, since the manifest records a single algorithm.
+        with self._gate:
+            self.limit = max(1, min(workers, self.workers))
+            self.chunk_size = chunk_size
+            self._gate.notify_all()
+        writer = self._writer
+        if writer:
+            writer.chunk_size = chunk_size
+            writer.max_pending = self.limit * 2 if self.limit > 1 else 1
+
+
+    def src_path(self, entry: FileEntry) -> str:
+        return os.path.join(self.src, *entry.path.split('/'))
+
+
+    def dest_path(self, entry: FileEntry) -> str:
+        return os.path.join(self.dest, *entry.path.split('/'))
+
+
+    def _advance(self, n: int) -> None:
+        with self._lock:
+            self.bytes_done += n
+            done = self.bytes_done
+        if self.on_progress:
+            self.on_progress(done, self.bytes_total)
+
+
+    def _timer(self, entry: FileEntry) -> PhaseTimer:
+        if not self.tracer:
+            return PhaseTimer(None, 0)
+        with self._lock:
+            self.files_started += 1
+            waiting = len(self.entries) - self.files_started
+        self.tracer.queue(QUEUE_FILES, waiting)
+        return PhaseTimer(self.tracer, self.tracer.file_id(entry.path, entry.size))
+
+
+    def _copy_entry(self, entry: FileEntry) -> None:
+        with self._gate:
+            while self._active >= self.limit and not self._stopped.is_set():
+                self._gate.wait()
+            self._active += 1
+        try:
+            self._copy_entry_gated(entry)
+        finally:
+            with self._gate:
+                self._active -= 1
+                self._gate.notify()
+
+
+    def _copy_entry_gated(self, entry: FileEntry) -> None:
+        if self._stopped.is_set():
+            return
+        timer = self._timer(entry)
+        # Files finished by an interrupted run keep the source mtime and size
+        dst = self.dest_path(entry)
+        if self.resume and os.path.exists(dst):
+            st = os.stat(dst)
+            if st.st_size == entry.size and int(st.st_mtime) == int(entry.mtime):
+                t = time.perf_counter()
+                entry.hash = hash_file(dst, self.hash_algo, self.chunk_size)
+                timer.add(PHASE_VERIFY, t, entry.size)
+                timer.flush()
+                self._advance(entry.size)
+                return
+        try:
+            entry.hash = copy_file(
+                self.src_path(entry),
+                dst,
+                hash_algo=self.hash_algo,
+                chunk_size=self.chunk_size,
+                on_progress=self._advance,
+                timer=timer,
+            )
+        except BaseException:
+            self._stopped.set()
+            raise
+        finally:
+            timer.flush()
+
+
+    def _run_dir(self) -> None:
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # list() re-raises the first copy error here
+            list(pool.map(self._copy_entry, self.entries))
+
+
+    def _run_archive(self) -> None:
+        # Archives are always written from scratch: an interrupted run leaves no
+        # index to resume from, so it goes to a temp name that is only renamed
+        # over any previous archive once every member has been verified
+        path = os.path.join(self.dest, ARCHIVE_NAME)
+        tmp = path + '.picard-tmp'
+        try:
+            with ArchiveWriter(
+                tmp,
+                workers=self.workers,
+                chunk_size=self.chunk_size,
+                hash_algo=self.hash_algo,
+            ) as archive:
+                self._writer = archive
+                self.throttle(self.limit, self.chunk_size)
+                for entry in self.entries:
+                    timer = self._timer(entry)
+                    try:
+                        entry.hash = archive.add(self.src_path(entry), entry.path, self._advance, timer).hash
+                    finally:
+                        timer.flush()
+
+            with ArchiveReader(tmp) as archive:
+                for entry in self.entries:
+                    timer = PhaseTimer(self.tracer, self.tracer.file_id(entry.path) if self.tracer else 0)
+                    t = time.perf_counter()
+                    verified = archive.verify(entry.path)
+                    timer.add(PHASE_VERIFY, t, entry.size)
+                    timer.flush()
+                    if not verified:
+                        raise BackupError(f"Verification failed for {entry.path} in {path}")
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        finally:
+            self._writer = None
+        os.replace(tmp, path)
+
+
+    def write_manifest(self) -> None:
+        manifest = {
+            'version': VERSION,
+            'created': time.time(),
+            'source': self.src,
+            'output': self.output,
+            'archive': ARCHIVE_NAME if self.output == OUTPUT_ARCHIVE else None,
+            'hash_algo': self.hash_algo,
+            'files': [entry.to_dict() for entry in self.entries],
+        }
+        path = os.path.join(self.dest, MANIFEST_NAME)
+        with open(path + '.picard-tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.picard-tmp', path)
+
+
+    def _delete_sources(self) -> None:
+        # Only reached once every file has been verified at the destination
+        for entry in self.entries:
+            timer = PhaseTimer(self.tracer, self.tracer.file_id(entry.path) if self.tracer else 0)
+            t = time.perf_counter()
+            os.remove(self.src_path(entry))
+            timer.add(PHASE_DELETE, t)
+            timer.flush()
+        if self.mode == MODE_MOVE:
+            for root, dirs, files in os.walk(self.src, topdown=False):
+                if root != self.src and not os.listdir(root):
+                    os.rmdir(root)
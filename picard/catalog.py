@@ -0,0 +1,245 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Callable, Iterable, Tuple
+from .const import *
+from .archive import ArchiveReader
+from .backup import FileEntry, copy_file, load_manifest
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    hash TEXT
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+CREATE INDEX IF NOT EXISTS files_ext ON files (ext);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime);
+CREATE INDEX IF NOT EXISTS files_size ON files (size);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+'''
+
+
+def _split(path: str) -> Tuple[str, str]:
+    # Root-level entries live in dir ''
+    if '/' in path:
+        return tuple(path.rsplit('/', 1))
+    return '', path
+
+
+def _escape_like(s: str) -> str:
+    # A search for IMG_1 would otherwise also match IMGX1
+    return s.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class Catalog:
+    def __init__(self, dest: str) -> None:
+        self.dest = os.path.abspath(dest)
+        self.manifest_path = os.path.join(self.dest, MANIFEST_NAME)
+        self.db_path = os.path.join(self.dest, CATALOG_NAME)
+        self.db = sqlite3.connect(self.db_path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        self.archive: Optional[str] = None
+        self.hash_algo = HASH_ALGO
+        self.refresh()
+
+
+    def close(self) -> None:
+        self.db.close()
+
+
+    def __enter__(self) -> 'Catalog':
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+
+
+    def refresh(self, force: bool = False) -> None:
+        # The manifest is the source of truth; it is only parsed again when it
+        # changes, otherwise everything comes from the db
+        stamp = str(os.stat(self.manifest_path).st_mtime_ns)
+        hash_algo = self._get_meta('hash_algo')
+        if not force and hash_algo and self._get_meta('manifest_mtime') == stamp:
+            self.archive = self._get_meta('archive') or None
+            self.hash_algo = hash_algo
+            return
+
+        manifest = load_manifest(self.dest)
+        self.archive = manifest['archive']
+        self.hash_algo = manifest['hash_algo']
+        dirs = set()
+        rows = []
+        for d in manifest['files']:
+            dir, name = _split(d['path'])
+            rows.append((d['path'], dir, name, os.path.splitext(name)[1].lower(), d['size'], d['mtime'], d['hash']))
+            while dir and dir not in dirs:
+                dirs.add(dir)
+                dir = _split(dir)[0]
+
+        with self.db:
+            self.db.execute('DELETE FROM files')
+            self.db.execute('DELETE FROM dirs')
+            self.db.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self.db.executemany('INSERT INTO dirs VALUES (?, ?)', [(dir, _split(dir)[0]) for dir in dirs])
+            self.db.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', [
+                ('manifest_mtime', stamp),
+                ('archive', self.archive or ''),
+                ('hash_algo', self.hash_algo),
+            ])
+
+
+    @property
+    def count(self) -> int:
+        return self.db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+
+    def list_dir(self, dir: str = '') -> Tuple[List[str], List[FileEntry]]:
+        dir = dir.strip('/')
+        subdirs = [row['path'] for row in self.db.execute(
+            'SELECT path FROM dirs WHERE parent = ? ORDER BY path', (dir,)
+        )]
+        files = [self._entry(row) for row in self.db.execute(
+            'SELECT * FROM files WHERE dir = ? ORDER BY name', (dir,)
+        )]
+        return subdirs, files
+
+
+    def search(
+        self,
+        name: Optional[str] = None,
+        *,
+        dir: Optional[str] = None,
+        exts: Optional[Iterable[str]] = None,
+        after: Optional[float] = None,
+        before: Optional[float] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[FileEntry]:
+        where = []
+        params = []
+        if name:
+            where.append("name LIKE ? ESCAPE '\\'")
+            params.append(f'%{_escape_like(name)}%')
+        if dir:
+            dir = dir.strip('/')
+            # An exact prefix compare; LIKE would also ignore ASCII case
+            where.append('(dir = ? OR substr(dir, 1, ?) = ?)')
+            params += [dir, len(dir) + 1, dir + '/']
+        if exts:
+            exts = [ext.lower() if ext.startswith('.') else '.' + ext.lower() for ext in exts]
+            where.append(f"ext IN ({', '.join('?' * len(exts))})")
+            params += exts
+        if after is not None:
+            where.append('mtime >= ?')
+            params.append(after)
+        if before is not None:
+            where.append('mtime < ?')
+            params.append(before)
+        if min_size is not None:
+            where.append('size >= ?')
+            params.append(min_size)
+        if max_size is not None:
+            where.append('size <= ?')
+            params.append(max_size)
+
+        sql = 'SELECT * FROM files'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY path'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [self._entry(row) for row in self.db.execute(sql, params)]
+
+
+    def _entry(self, row: sqlite3.Row) -> FileEntry:
+        return FileEntry(row['path'], row['size'], row['mtime'], row['hash'])
+
+
+    def resolve(self, paths: Iterable[str]) -> List[FileEntry]:
+        # Accepts files and folders; folders expand to everything below them
+        entries: Dict[str, FileEntry] = {}
+        for path in paths:
+            path = path.strip('/')
+            row = self.db.execute('SELECT * FROM files WHERE path = ?', (path,)).fetchone()
+            if row:
+                entries[path] = self._entry(row)
+                continue
+            found = self.search(dir=path) if path else self.search()
+            if not found:
+                raise KeyError(f"{path} not found in backup {self.dest}")
+            for entry in found:
+                entries[entry.path] = entry
+        return [entries[path] for path in sorted(entries)]
+
+
+    def restore(
+        self,
+        paths: Iterable[str],
+        target: str,
+        *,
+        workers: int = COPY_WORKERS,
+        chunk_size: int = COPY_CHUNK_SIZE,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> List[FileEntry]:
+        entries = self.resolve(paths)
+        total = sum(entry.size for entry in entries)
+        done = [0]
+        lock = threading.Lock()
+
+        def advance(n: int) -> None:
+            with lock:
+                done[0] += n
+                current = done[0]
+            if on_progress:
+                on_progress(current, total)
+
+        def target_path(entry: FileEntry) -> str:
+            return os.path.join(target, *entry.path.split('/'))
+
+        if self.archive:
+            with ArchiveReader(os.path.join(self.dest, self.archive)) as archive:
+                def restore_entry(entry: FileEntry) -> None:
+                    archive.extract(entry.path, target_path(entry), advance)
+
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(restore_entry, entries))
+        else:
+            def restore_entry(entry: FileEntry) -> None:
+                src = os.path.join(self.dest, *entry.path.split('/'))
+                # A rotted backup copy must fail before it replaces the file on the card
+                copy_file(
+                    src,
+                    target_path(entry),
+                    hash_algo=self.hash_algo,
+                    chunk_size=chunk_size,
+                    expected=entry.hash,
+                    on_progress=advance,
+                )
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(restore_entry, entries))
+        return entries
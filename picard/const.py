@@ -3,6 +3,7 @@ VERSION = '0.1'
 SCREEN_W = 320
 SCREEN_H = 240
 
+COLOR_BLACK = (0, 0, 0)
 COLOR_WHITE = (255, 255, 255)
 COLOR_SKYBLUE = (139, 185, 203)
 
@@ -15,5 +16,62 @@ PADDING_LEFT = 10
 PADDING_RIGHT = 10
 PADDING_BOTTOM = 10
 
+ANIMATION_FPS = 24
+
+ALIGN_START = 0
+ALIGN_CENTER = 1
+ALIGN_END = 2
+ALIGN_STRETCH = 3
+
 FOOTER_CLOCK = '__FOOTER_CLOCK__'
-FOOTER_BATT = '__FOOTER_BATT__'
\ No newline at end of file
+FOOTER_BATT = '__FOOTER_BATT__'
+
+OUTPUT_DIR = 1
+OUTPUT_ARCHIVE = 2
+
+COPY_CHUNK_SIZE = 1024 * 1024
+COPY_WORKERS = 2
+HASH_ALGO = 'sha1'
+COMPRESS_LEVEL = 3
+
+MANIFEST_NAME = 'picard-manifest.json'
+ARCHIVE_NAME = 'picard-backup.pca'
+CATALOG_NAME = 'picard-catalog.db'
+JOBS_FILE = '~/.picard/jobs.json'
+TRACE_DIR = '~/.picard/traces'
+TRACE_BUFFER_SIZE = 64 * 1024
+TRACE_STALL_THRESHOLD = 0.5
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_PAUSED = 'paused'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+MAX_JOBS = 3
+MAX_JOBS_PER_DEST = 3
+# How far (in bytes / priority) one job may run ahead of the others on its disk
+DEST_SHARE_SLACK = 4 * COPY_CHUNK_SIZE
+# Seconds without progress after which a job stops holding the others back
+DEST_IDLE = 1.0
+
+POWER_INTERVAL = 2.0
+POWER_NORMAL = 0
+POWER_WARM = 1
+POWER_HOT = 2
+POWER_CRITICAL = 3
+# SoC temperature (C) at which each level starts; the Pi firmware soft-throttles at 80
+TEMP_WARM = 65.0
+TEMP_HOT = 72.0
+TEMP_CRITICAL = 78.0
+TEMP_HYSTERESIS = 3.0
+BATT_LOW = 20
+BATT_CRITICAL = 10
+
+# Already compressed formats, stored as-is in archives
+COMPRESSED_EXTS = {
+    '.jpg', '.jpeg', '.heic', '.heif', '.png', '.gif', '.webp',
+    '.mp4', '.mov', '.m4v', '.mts', '.m2ts', '.avi', '.mp3', '.m4a', '.aac',
+    '.zip', '.gz', '.7z', '.zst',
+}
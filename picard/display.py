@@ -0,0 +1,122 @@
+import os
+import mmap
+import stat
+import pygame
+from typing import List, Tuple, Union, Optional
+
+
+class Display:
+    def __init__(self, screen_size: Optional[Union[Tuple[int], List[int]]] = None) -> None:
+        if screen_size:
+            self.surface = pygame.display.set_mode(screen_size)
+        else:
+            self.surface = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.surface.get_size()
+
+
+    def flip(self):
+        pygame.display.flip()
+
+
+    def update(self, rects: List[pygame.Rect]):
+        pygame.display.update(rects)
+
+
+    def close(self):
+        pass
+
+
+def read_fb_geometry(device: str) -> Tuple[Tuple[int, int], int, int]:
+    # /dev/fb1 -> /sys/class/graphics/fb1/{virtual_size,bits_per_pixel,stride}
+    sysfs = os.path.join('/sys/class/graphics', os.path.basename(device))
+    with open(os.path.join(sysfs, 'virtual_size')) as f:
+        w, h = (int(i) for i in f.read().strip().split(','))
+    with open(os.path.join(sysfs, 'bits_per_pixel')) as f:
+        bpp = int(f.read().strip())
+    with open(os.path.join(sysfs, 'stride')) as f:
+        stride = int(f.read().strip())
+    return (w, h), bpp, stride
+
+
+class FramebufferDisplay(Display):
+    # Composes into an offscreen SDL surface and copies only dirty rects,
+    # converted to the panel format, into a memory-mapped /dev/fb*.
+    # Any regular file of the right size works in place of the device, but
+    # then screen_size and bpp must be given since there's no sysfs entry.
+    # SDL runs on its dummy driver here, so it delivers no keyboard or QUIT
+    # events; the app has to be stopped with a signal instead.
+    def __init__(
+        self,
+        device: str = '/dev/fb1',
+        screen_size: Optional[Union[Tuple[int], List[int]]] = None,
+        *,
+        bpp: Optional[int] = None,
+        stride: Optional[int] = None,
+    ) -> None:
+        # numpy is only needed by this backend, so the SDL path doesn't require it
+        import numpy as np
+
+        if stat.S_ISCHR(os.stat(device).st_mode):
+            # A real panel's rows may be padded, so its stride always comes from sysfs
+            sys_size, sys_bpp, stride = read_fb_geometry(device)
+            screen_size = screen_size or sys_size
+            bpp = bpp or sys_bpp
+        elif not screen_size or not bpp:
+            raise ValueError(f"{device} is not a framebuffer device; screen_size and bpp are required")
+        if bpp not in [16, 32]:
+            raise ValueError(f"Unsupported framebuffer depth: {bpp} bpp")
+        w, h = screen_size
+        self.bpp = bpp
+        self.stride = stride or w * bpp // 8
+
+        # SDL only needs to give us a surface; the dummy driver never touches the panel
+        if pygame.display.get_init():
+            pygame.display.quit()
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        pygame.display.init()
+        self.surface = pygame.display.set_mode((w, h))
+
+        self.file = open(device, 'r+b')
+        self.mmap = mmap.mmap(self.file.fileno(), self.stride * h)
+        dtype = np.dtype('<u2') if bpp == 16 else np.dtype('<u4')
+        self.fb = np.ndarray(
+            (h, w),
+            dtype=dtype,
+            buffer=self.mmap,
+            strides=(self.stride, dtype.itemsize),
+        )
+
+
+    def flip(self):
+        self.update([self.surface.get_rect()])
+
+
+    def update(self, rects: List[pygame.Rect]):
+        import numpy as np
+        screen_rect = self.surface.get_rect()
+        # pixels3d is a locked (x, y, rgb) view, no copy of the screen
+        pixels = pygame.surfarray.pixels3d(self.surface)
+        try:
+            for rect in rects:
+                rect = pygame.Rect(rect).clip(screen_rect)
+                if not rect.w or not rect.h:
+                    continue
+                rgb = pixels[rect.left:rect.right, rect.top:rect.bottom].astype(np.uint32)
+                r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+                if self.bpp == 16:
+                    packed = ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)
+                else:
+                    packed = 0xff000000 | (r << 16) | (g << 8) | b
+                self.fb[rect.top:rect.bottom, rect.left:rect.right] = packed.T
+        finally:
+            del pixels
+
+
+    def close(self):
+        del self.fb
+        self.mmap.close()
+        self.file.close()
@@ -0,0 +1,479 @@
+import os
+import json
+import time
+import uuid
+import threading
+from typing import List, Dict, Optional, Callable
+from .const import *
+from .backup import Backup
+from .power import Governor, Policy, PowerSample
+from .trace import Tracer
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(
+        self,
+        src: str,
+        dest: str,
+        *,
+        mode: int = MODE_COPY,
+        output: int = OUTPUT_DIR,
+        priority: int = 1,
+        id: Optional[str] = None,
+        status: str = JOB_QUEUED,
+        bytes_done: int = 0,
+        bytes_total: int = 0,
+        error: Optional[str] = None,
+        created: Optional[float] = None,
+    ) -> None:
+        if priority < 1:
+            raise ValueError(f"priority must be at least 1, not {priority}")
+        self.id = id or uuid.uuid4().hex[:12]
+        self.src = src
+        self.dest = dest
+        self.mode = mode
+        self.output = output
+        self.priority = priority
+        self.status = status
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self.error = error
+        self.created = created if created is not None else time.time()
+        # Set while the job may run, cleared to pause it
+        self.run_event = threading.Event()
+        self.run_event.set()
+
+
+    @property
+    def progress(self) -> float:
+        return self.bytes_done / self.bytes_total if self.bytes_total else 0.0
+
+
+    @property
+    def finished(self) -> bool:
+        return self.status in [JOB_DONE, JOB_FAILED, JOB_CANCELLED]
+
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'src': self.src,
+            'dest': self.dest,
+            'mode': self.mode,
+            'output': self.output,
+            'priority': self.priority,
+            'status': self.status,
+            'bytes_done': self.bytes_done,
+            'bytes_total': self.bytes_total,
+            'error': self.error,
+            'created': self.created,
+        }
+
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'Job':
+        return cls(
+            d['src'],
+            d['dest'],
+            mode=d['mode'],
+            output=d['output'],
+            priority=d['priority'],
+            id=d['id'],
+            status=d['status'],
+            bytes_done=d['bytes_done'],
+            bytes_total=d['bytes_total'],
+            error=d['error'],
+            created=d['created'],
+        )
+
+
+class JobQueue:
+    def __init__(self, path: str = JOBS_FILE) -> None:
+        self.path = os.path.expanduser(path)
+        self.jobs: Dict[str, Job] = {}
+        self.lock = threading.RLock()
+        self.load()
+
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        with self.lock:
+            for d in data['jobs']:
+                job = Job.from_dict(d)
+                # Whatever was running when we went down starts over; directory
+                # backups skip files already copied, archives are rewritten
+                if job.status == JOB_RUNNING:
+                    job.status = JOB_QUEUED
+                if job.status == JOB_PAUSED:
+                    job.run_event.clear()
+                self.jobs[job.id] = job
+
+
+    def save(self):
+        with self.lock:
+            data = {'jobs': [job.to_dict() for job in self.jobs.values()]}
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path + '.picard-tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.path + '.picard-tmp', self.path)
+
+
+    def add(self, job: Job) -> Job:
+        with self.lock:
+            self.jobs[job.id] = job
+        self.save()
+        return job
+
+
+    def get(self, id: str) -> Job:
+        try:
+            return self.jobs[id]
+        except KeyError:
+            raise KeyError(f"No such job: {id}")
+
+
+    def pending(self) -> List[Job]:
+        # Highest priority first, then first come first served
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if job.status == JOB_QUEUED]
+        return sorted(jobs, key=lambda job: (-job.priority, job.created))
+
+
+    def clear_finished(self):
+        with self.lock:
+            for id in [id for id, job in self.jobs.items() if job.finished]:
+                del self.jobs[id]
+        self.save()
+
+
+def device_of(path: str) -> int:
+    # The destination may not exist yet; its nearest existing parent is on the same disk
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return os.stat(path).st_dev
+
+
+class DestinationLimiter:
+    # Shares one destination disk between its running jobs in proportion to
+    # their priority. Each job's bytes advance a virtual clock at 1/priority,
+    # and a job that gets too far ahead of the slowest active one waits for
+    # it, so the disk runs at whatever speed it manages without a tuned rate.
+    # An optional bytes/s rate caps the whole disk on top of that.
+    def __init__(
+        self,
+        rate: Optional[int] = None,
+        *,
+        slack: float = DEST_SHARE_SLACK,
+        idle: float = DEST_IDLE,
+    ) -> None:
+        self.rate = rate
+        self.slack = slack
+        self.idle = idle
+        self.jobs: Dict[str, Job] = {}
+        self.vtime: Dict[str, float] = {}
+        self.last_seen: Dict[str, float] = {}
+        self.next_time: Dict[str, float] = {}
+        self.cond = threading.Condition()
+
+
+    def _active(self, now: float) -> List[str]:
+        # Paused jobs and ones busy elsewhere (scanning, verifying) don't hold the others back
+        return [
+            id for id, job in self.jobs.items()
+            if job.run_event.is_set() and now - self.last_seen[id] < self.idle
+        ]
+
+
+    def _floor(self, now: float, exclude: str) -> Optional[float]:
+        times = [self.vtime[id] for id in self._active(now) if id != exclude]
+        return min(times) if times else None
+
+
+    def enter(self, job: Job):
+        with self.cond:
+            now = time.monotonic()
+            # Start level with the others rather than being owed a burst
+            self.vtime[job.id] = self._floor(now, job.id) or 0.0
+            self.last_seen[job.id] = now
+            self.next_time[job.id] = now
+            self.jobs[job.id] = job
+
+
+    def leave(self, job: Job):
+        with self.cond:
+            self.jobs.pop(job.id, None)
+            self.vtime.pop(job.id, None)
+            self.last_seen.pop(job.id, None)
+            self.next_time.pop(job.id, None)
+            self.cond.notify_all()
+
+
+    @property
+    def count(self) -> int:
+        # A paused job gives up its slot
+        return sum(1 for job in self.jobs.values() if job.run_event.is_set())
+
+
+    def consume(self, job: Job, n: int):
+        with self.cond:
+            now = time.monotonic()
+            floor = self._floor(now, job.id)
+            if now - self.last_seen[job.id] >= self.idle and floor is not None:
+                # Back from a pause or a long verify; don't let it starve the others to catch up
+                self.vtime[job.id] = max(self.vtime[job.id], floor)
+            self.vtime[job.id] += n / job.priority
+            self.last_seen[job.id] = now
+            self.cond.notify_all()
+            while job.status == JOB_RUNNING:
+                floor = self._floor(time.monotonic(), job.id)
+                if floor is None or self.vtime[job.id] - floor <= self.slack:
+                    break
+                self.cond.wait(self.idle / 4)
+
+            delay = 0.0
+            if self.rate:
+                weight = sum(j.priority for j in self.jobs.values() if j.run_event.is_set()) or job.priority
+                share = self.rate * job.priority / weight
+                now = time.monotonic()
+                self.next_time[job.id] = max(now, self.next_time[job.id]) + n / share
+                delay = self.next_time[job.id] - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Scheduler:
+    def __init__(
+        self,
+        queue: JobQueue,
+        *,
+        max_jobs: int = MAX_JOBS,
+        max_jobs_per_dest: int = MAX_JOBS_PER_DEST,
+        dest_rate: Optional[int] = None,
+        workers: int = COPY_WORKERS,
+        governor: Optional[Governor] = None,
+        trace_dir: Optional[str] = TRACE_DIR,
+        on_update: Optional[Callable[[Job], None]] = None,
+    ) -> None:
+        self.queue = queue
+        self.max_jobs = max_jobs
+        self.max_jobs_per_dest = max_jobs_per_dest
+        self.dest_rate = dest_rate
+        self.workers = workers
+        self.governor = governor
+        self.on_update = on_update
+        self.trace_dir = trace_dir
+        self.backups: Dict[str, Backup] = {}
+        self.limiters: Dict[int, DestinationLimiter] = {}
+        self.threads: Dict[str, threading.Thread] = {}
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.last_save = 0.0
+        if governor:
+            governor.on_change.append(self._apply_policy)
+
+
+    def submit(
+        self,
+        src: str,
+        dest: str,
+        *,
+        mode: int = MODE_COPY,
+        output: int = OUTPUT_DIR,
+        priority: int = 1,
+    ) -> Job:
+        job = self.queue.add(Job(src, dest, mode=mode, output=output, priority=priority))
+        self.wakeup.set()
+        return job
+
+
+    # Status changes happen under the queue lock so they can't race the
+    # scheduler claiming a queued job
+
+    def pause(self, id: str):
+        job = self.queue.get(id)
+        with self.queue.lock:
+            if job.status not in [JOB_QUEUED, JOB_RUNNING]:
+                return
+            job.run_event.clear()
+            job.status = JOB_PAUSED
+        self._changed(job, save=True)
+        # Its slot is free for another job while it waits
+        self.wakeup.set()
+
+
+    def resume(self, id: str):
+        job = self.queue.get(id)
+        with self.queue.lock:
+            if job.status != JOB_PAUSED:
+                return
+            # A paused job that never started goes back in line
+            job.status = JOB_RUNNING if id in self.threads else JOB_QUEUED
+            job.run_event.set()
+        self._changed(job, save=True)
+        self.wakeup.set()
+
+
+    def cancel(self, id: str):
+        job = self.queue.get(id)
+        with self.queue.lock:
+            if job.finished:
+                return
+            job.status = JOB_CANCELLED
+            # Wake a paused worker so it notices the cancel
+            job.run_event.set()
+        self._changed(job, save=True)
+
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name='picard-scheduler', daemon=True)
+        self.thread.start()
+
+
+    def stop(self, timeout: Optional[float] = None):
+        # Running jobs stop at their next chunk and keep their status, so they
+        # are picked up again (skipping finished files) on the next start
+        self.running = False
+        self.wakeup.set()
+        for job in [self.queue.get(id) for id in list(self.threads)]:
+            job.run_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+        for thread in list(self.threads.values()):
+            thread.join(timeout)
+
+
+    @property
+    def active(self) -> int:
+        # Paused jobs keep their thread but don't count against the limits
+        return sum(1 for id in list(self.threads) if self.queue.get(id).run_event.is_set())
+
+
+    def _changed(self, job: Job, save: bool = False):
+        now = time.monotonic()
+        if save or now - self.last_save >= 1:
+            self.last_save = now
+            self.queue.save()
+        if self.on_update:
+            self.on_update(job)
+
+
+    @property
+    def policy(self) -> Policy:
+        if self.governor:
+            return self.governor.policy
+        return Policy(workers=self.workers, max_jobs=self.max_jobs)
+
+
+    def _apply_policy(self, policy: Policy, sample: PowerSample):
+        # Running backups take the new worker cap and chunk size right away; the hash only changes for new jobs
+        for backup in list(self.backups.values()):
+            backup.throttle(policy.workers, policy.chunk_size)
+            if backup.tracer:
+                backup.tracer.event('policy', sample=sample.to_dict(), **policy.to_dict())
+        self.wakeup.set()
+
+
+    def _limiter(self, job: Job) -> DestinationLimiter:
+        dev = device_of(job.dest)
+        if dev not in self.limiters:
+            self.limiters[dev] = DestinationLimiter(self.dest_rate)
+        return self.limiters[dev]
+
+
+    def _loop(self):
+        while self.running:
+            self.wakeup.clear()
+            max_jobs = min(self.max_jobs, self.policy.max_jobs)
+            for job in self.queue.pending():
+                if self.active >= max_jobs:
+                    break
+                limiter = self._limiter(job)
+                if limiter.count >= self.max_jobs_per_dest:
+                    continue
+                with self.queue.lock:
+                    # The snapshot may be stale; the job could have been paused or cancelled since
+                    if job.status != JOB_QUEUED:
+                        continue
+                    job.status = JOB_RUNNING
+                    thread = threading.Thread(target=self._run, args=(job, limiter), name=f'picard-job-{job.id}', daemon=True)
+                    self.threads[job.id] = thread
+                limiter.enter(job)
+                self._changed(job, save=True)
+                thread.start()
+            self.wakeup.wait(1)
+
+
+    def _run(self, job: Job, limiter: DestinationLimiter):
+        # Called per chunk from every copy worker of this job
+        lock = threading.Lock()
+
+        def on_progress(done: int, total: int):
+            if not job.run_event.is_set():
+                job.run_event.wait()
+            if job.status == JOB_CANCELLED or not self.running:
+                raise JobCancelled(job.id)
+            with lock:
+                delta = max(0, done - job.bytes_done)
+                job.bytes_done = max(done, job.bytes_done)
+                job.bytes_total = total
+            limiter.consume(job, delta)
+            self._changed(job)
+
+        policy = self.policy
+        tracer = None
+        try:
+            if self.trace_dir:
+                tracer = Tracer(
+                    os.path.join(self.trace_dir, f'{job.id}-{int(time.time())}.trace'),
+                    {'job': job.to_dict(), 'policy': policy.to_dict()},
+                )
+            backup = Backup(
+                job.src,
+                job.dest,
+                mode=job.mode,
+                output=job.output,
+                workers=self.workers,
+                chunk_size=policy.chunk_size,
+                hash_algo=policy.hash_algo,
+                resume=True,
+                tracer=tracer,
+                on_progress=on_progress,
+            )
+            # Sized for normal conditions so it can speed up again once the policy relaxes
+            backup.throttle(policy.workers, policy.chunk_size)
+            self.backups[job.id] = backup
+            backup.scan()
+            # Progress saved by an interrupted run would otherwise hide the first bytes from the limiter
+            with lock:
+                job.bytes_done = 0
+                job.bytes_total = backup.bytes_total
+            backup.run()
+            with self.queue.lock:
+                if job.status != JOB_CANCELLED:
+                    job.status = JOB_DONE
+        except JobCancelled:
+            pass
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = str(e)
+        finally:
+            if tracer:
+                tracer.event('finish', status=job.status, error=job.error)
+                tracer.close()
+            limiter.leave(job)
+            self.backups.pop(job.id, None)
+            del self.threads[job.id]
+            self._changed(job, save=True)
+            self.wakeup.set()
@@ -0,0 +1,308 @@
+import pygame
+from typing import List, Tuple, Optional, Union, TYPE_CHECKING
+from .const import *
+
+if TYPE_CHECKING:
+    from .ui import Element
+
+
+def normalize_padding(padding: Union[int, Tuple[int, ...]]) -> Tuple[int, int, int, int]:
+    # Same (top, right, bottom, left) order as UIElement.scale_boundary
+    if type(padding) == int:
+        return (padding,) * 4
+    if type(padding) in [list, tuple] and 4 % len(padding) == 0:
+        return tuple(padding) * (4 // len(padding))
+    raise ValueError(f"padding must be an int or a tuple of length 1, 2, 4, not {padding}")
+
+
+class LayoutNode:
+    # Measure and arrange results are cached per node. invalidate() dirties a
+    # node and its ancestors only; arrange() skips any subtree whose slot is
+    # unchanged and that has nothing dirty below it.
+    def __init__(
+        self,
+        *,
+        padding: Union[int, Tuple[int, ...]] = 0,
+        grow: int = 0,
+        align_self: Optional[int] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+    ) -> None:
+        self.parent: Optional[LayoutNode] = None
+        self.padding = normalize_padding(padding)
+        self.grow = grow
+        # Overrides the parent container's align for this node only
+        self.align_self = align_self
+        self.width = width
+        self.height = height
+        self.rect: Optional[pygame.Rect] = None
+        self._size: Optional[Tuple[int, int]] = None
+        self._measure_dirty = True
+        self._arrange_dirty = True
+
+
+    @property
+    def dirty(self) -> bool:
+        return self._measure_dirty or self._arrange_dirty
+
+
+    def invalidate(self) -> None:
+        node = self
+        while node is not None and not node._measure_dirty:
+            node._measure_dirty = True
+            node._arrange_dirty = True
+            node = node.parent
+        # Already-dirty ancestors may still be waiting on arrange only
+        while node is not None and not node._arrange_dirty:
+            node._arrange_dirty = True
+            node = node.parent
+
+
+    def measure(self) -> Tuple[int, int]:
+        if self._measure_dirty or self._size is None:
+            w, h = self.measure_content()
+            top, right, bottom, left = self.padding
+            self._size = (
+                self.width if self.width is not None else w + left + right,
+                self.height if self.height is not None else h + top + bottom,
+            )
+            self._measure_dirty = False
+        return self._size
+
+
+    def arrange(self, rect: Union[pygame.Rect, Tuple[int, int, int, int]]) -> None:
+        rect = pygame.Rect(rect)
+        if not self._arrange_dirty and rect == self.rect:
+            return
+        self.rect = rect
+        self._arrange_dirty = False
+        top, right, bottom, left = self.padding
+        self.arrange_content(pygame.Rect(
+            rect.x + left,
+            rect.y + top,
+            max(0, rect.w - left - right),
+            max(0, rect.h - top - bottom),
+        ))
+
+
+    def update(self, rect: Union[pygame.Rect, Tuple[int, int, int, int]]) -> None:
+        self.measure()
+        self.arrange(rect)
+
+
+    def measure_content(self) -> Tuple[int, int]:
+        return (0, 0)
+
+
+    def arrange_content(self, inner: pygame.Rect) -> None:
+        pass
+
+
+    def items(self) -> List['Item']:
+        return []
+
+
+class Item(LayoutNode):
+    def __init__(
+        self,
+        element: 'Element',
+        *,
+        padding: Union[int, Tuple[int, ...]] = 0,
+        grow: int = 0,
+        align_self: Optional[int] = None,
+    ) -> None:
+        super().__init__(padding=padding, grow=grow, align_self=align_self)
+        self.element = element
+        self.content_size: Optional[Tuple[int, int]] = None
+        element.layout_node = self
+
+
+    def sync(self) -> None:
+        if self.element.rect.size != self.content_size:
+            self.invalidate()
+
+
+    def measure_content(self) -> Tuple[int, int]:
+        self.content_size = self.element.rect.size
+        return self.content_size
+
+
+    def arrange_content(self, inner: pygame.Rect) -> None:
+        self.element.move(inner.x, inner.y)
+
+
+    def items(self) -> List['Item']:
+        return [self]
+
+
+class Spacer(LayoutNode):
+    def __init__(self, grow: int = 1, *, width: int = 0, height: int = 0) -> None:
+        super().__init__(grow=grow, width=width, height=height)
+
+
+def _as_node(child: Union[LayoutNode, 'Element']) -> LayoutNode:
+    return child if isinstance(child, LayoutNode) else Item(child)
+
+
+def _align_offset(align: int, free: int) -> int:
+    if align == ALIGN_CENTER:
+        return free // 2
+    if align == ALIGN_END:
+        return free
+    return 0
+
+
+class Container(LayoutNode):
+    def __init__(
+        self,
+        *children: Union[LayoutNode, 'Element'],
+        spacing: int = 0,
+        padding: Union[int, Tuple[int, ...]] = 0,
+        grow: int = 0,
+        align: int = ALIGN_START,
+        align_self: Optional[int] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+    ) -> None:
+        super().__init__(padding=padding, grow=grow, align_self=align_self, width=width, height=height)
+        self.align = align
+        self.spacing = spacing
+        self.children: List[LayoutNode] = []
+        for child in children:
+            self.add(child)
+
+
+    def add(self, child: Union[LayoutNode, 'Element']) -> LayoutNode:
+        node = _as_node(child)
+        node.parent = self
+        self.children.append(node)
+        self.invalidate()
+        return node
+
+
+    def remove(self, node: LayoutNode) -> None:
+        self.children.remove(node)
+        node.parent = None
+        self.invalidate()
+
+
+    def items(self) -> List[Item]:
+        items = []
+        for child in self.children:
+            items += child.items()
+        return items
+
+
+class _Linear(Container):
+    horizontal = False
+
+    def measure_content(self) -> Tuple[int, int]:
+        main_axis = 0 if self.horizontal else 1
+        sizes = [child.measure() for child in self.children]
+        main = sum(size[main_axis] for size in sizes) + self.spacing * max(0, len(sizes) - 1)
+        cross = max((size[1 - main_axis] for size in sizes), default=0)
+        return (main, cross) if self.horizontal else (cross, main)
+
+
+    def arrange_content(self, inner: pygame.Rect) -> None:
+        main_axis = 0 if self.horizontal else 1
+        cross_axis = 1 - main_axis
+        inner_main = inner.size[main_axis]
+        inner_cross = inner.size[cross_axis]
+
+        sizes = [child.measure() for child in self.children]
+        natural = sum(size[main_axis] for size in sizes) + self.spacing * max(0, len(sizes) - 1)
+        free = max(0, inner_main - natural)
+        total_grow = sum(child.grow for child in self.children)
+        shares = [0] * len(self.children)
+        if total_grow:
+            growing = [i for i, child in enumerate(self.children) if child.grow]
+            for i in growing:
+                shares[i] = free * self.children[i].grow // total_grow
+            # Hand the rounding remainder to the last growing child
+            shares[growing[-1]] += free - sum(shares)
+
+        pos = inner.topleft[main_axis]
+        for i, child in enumerate(self.children):
+            main = sizes[i][main_axis] + shares[i]
+            align = child.align_self if child.align_self is not None else self.align
+            if align == ALIGN_STRETCH:
+                cross, offset = inner_cross, 0
+            else:
+                cross = sizes[i][cross_axis]
+                offset = _align_offset(align, inner_cross - cross)
+            cross_pos = inner.topleft[cross_axis] + offset
+
+            if self.horizontal:
+                child.arrange((pos, cross_pos, main, cross))
+            else:
+                child.arrange((cross_pos, pos, cross, main))
+            pos += main + self.spacing
+
+
+class Stack(_Linear):
+    horizontal = False
+
+
+class Row(_Linear):
+    horizontal = True
+
+
+class Grid(Container):
+    def __init__(
+        self,
+        *children: Union[LayoutNode, 'Element'],
+        columns: int,
+        spacing: int = 0,
+        padding: Union[int, Tuple[int, ...]] = 0,
+        grow: int = 0,
+        align: int = ALIGN_START,
+        align_self: Optional[int] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+    ) -> None:
+        if columns < 1:
+            raise ValueError(f"columns must be at least 1, not {columns}")
+        self.columns = columns
+        super().__init__(*children, spacing=spacing, padding=padding, grow=grow, align=align, align_self=align_self, width=width, height=height)
+
+
+    def _tracks(self) -> Tuple[List[int], List[int]]:
+        col_w = [0] * self.columns
+        row_h = [0] * ((len(self.children) + self.columns - 1) // self.columns)
+        for i, child in enumerate(self.children):
+            w, h = child.measure()
+            col_w[i % self.columns] = max(col_w[i % self.columns], w)
+            row_h[i // self.columns] = max(row_h[i // self.columns], h)
+        return col_w, row_h
+
+
+    def measure_content(self) -> Tuple[int, int]:
+        col_w, row_h = self._tracks()
+        return (
+            sum(col_w) + self.spacing * max(0, len(col_w) - 1),
+            sum(row_h) + self.spacing * max(0, len(row_h) - 1),
+        )
+
+
+    def arrange_content(self, inner: pygame.Rect) -> None:
+        col_w, row_h = self._tracks()
+        for i, child in enumerate(self.children):
+            col, row = i % self.columns, i // self.columns
+            cell = pygame.Rect(
+                inner.x + sum(col_w[:col]) + self.spacing * col,
+                inner.y + sum(row_h[:row]) + self.spacing * row,
+                col_w[col],
+                row_h[row],
+            )
+            align = child.align_self if child.align_self is not None else self.align
+            if align == ALIGN_STRETCH:
+                child.arrange(cell)
+            else:
+                w, h = child.measure()
+                child.arrange((
+                    cell.x + _align_offset(align, cell.w - w),
+                    cell.y + _align_offset(align, cell.h - h),
+                    w,
+                    h,
+                ))
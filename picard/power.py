@@ -0,0 +1,250 @@
+import os
+import glob
+import time
+import logging
+import threading
+from collections import deque
+from typing import List, Dict, Optional, Callable, Deque
+from .const import *
+
+
+logger = logging.getLogger(__name__)
+
+THROTTLED_UNDERVOLTAGE = 1 << 0
+THROTTLED_FREQ_CAPPED = 1 << 1
+THROTTLED_THROTTLED = 1 << 2
+THROTTLED_SOFT_TEMP = 1 << 3
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _read_int(path: str, base: int = 10) -> Optional[int]:
+    # A missing or garbled value just leaves that reading unknown
+    value = _read(path)
+    if not value:
+        return None
+    try:
+        return int(value, base)
+    except ValueError:
+        logger.warning('unreadable power value %r in %s', value, path)
+        return None
+
+
+class PowerSample:
+    def __init__(
+        self,
+        temp: Optional[float] = None,
+        battery: Optional[int] = None,
+        voltage: Optional[float] = None,
+        on_battery: bool = False,
+        throttled: int = 0,
+    ) -> None:
+        self.temp = temp
+        self.battery = battery
+        self.voltage = voltage
+        self.on_battery = on_battery
+        self.throttled = throttled
+        self.time = time.time()
+
+
+    @property
+    def undervoltage(self) -> bool:
+        return bool(self.throttled & THROTTLED_UNDERVOLTAGE)
+
+
+    def to_dict(self) -> Dict:
+        return {
+            'time': self.time,
+            'temp': self.temp,
+            'battery': self.battery,
+            'voltage': self.voltage,
+            'on_battery': self.on_battery,
+            'throttled': self.throttled,
+        }
+
+
+def read_sample(root: str = '/') -> PowerSample:
+    # root lets a fake sysfs tree stand in for the real one
+    sample = PowerSample()
+
+    temp = _read_int(os.path.join(root, 'sys/class/thermal/thermal_zone0/temp'))
+    if temp is not None:
+        sample.temp = temp / 1000
+
+    for supply in sorted(glob.glob(os.path.join(root, 'sys/class/power_supply/*'))):
+        if _read(os.path.join(supply, 'type')) != 'Battery':
+            continue
+        sample.battery = _read_int(os.path.join(supply, 'capacity'))
+        voltage = _read_int(os.path.join(supply, 'voltage_now'))
+        if voltage is not None:
+            sample.voltage = voltage / 1000000
+        sample.on_battery = _read(os.path.join(supply, 'status')) == 'Discharging'
+        break
+
+    throttled = _read_int(os.path.join(root, 'sys/devices/platform/soc/soc:firmware/get_throttled'), 16)
+    if throttled is not None:
+        sample.throttled = throttled
+    else:
+        # Older kernels only expose the undervoltage alarm through hwmon
+        for alarm in glob.glob(os.path.join(root, 'sys/class/hwmon/hwmon*/in0_lcrit_alarm')):
+            if _read(alarm) == '1':
+                sample.throttled |= THROTTLED_UNDERVOLTAGE
+    return sample
+
+
+class Policy:
+    def __init__(
+        self,
+        level: int = POWER_NORMAL,
+        workers: int = COPY_WORKERS,
+        chunk_size: int = COPY_CHUNK_SIZE,
+        hash_algo: str = HASH_ALGO,
+        fps: int = 30,
+        max_jobs: int = MAX_JOBS,
+        reasons: Optional[List[str]] = None,
+    ) -> None:
+        self.level = level
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.hash_algo = hash_algo
+        self.fps = fps
+        self.max_jobs = max_jobs
+        self.reasons: List[str] = reasons if reasons is not None else []
+
+
+    def to_dict(self) -> Dict:
+        return {
+            'level': self.level,
+            'workers': self.workers,
+            'chunk_size': self.chunk_size,
+            'hash_algo': self.hash_algo,
+            'fps': self.fps,
+            'max_jobs': self.max_jobs,
+            'reasons': self.reasons,
+        }
+
+
+    def __eq__(self, other) -> bool:
+        # Reasons carry live readings; only the knobs decide whether anything changed
+        if not isinstance(other, Policy):
+            return False
+        mine, theirs = self.to_dict(), other.to_dict()
+        del mine['reasons'], theirs['reasons']
+        return mine == theirs
+
+
+def thermal_level(temp: Optional[float], previous: int = POWER_NORMAL) -> int:
+    if temp is None:
+        return POWER_NORMAL
+    thresholds = [(POWER_CRITICAL, TEMP_CRITICAL), (POWER_HOT, TEMP_HOT), (POWER_WARM, TEMP_WARM)]
+    for level, threshold in thresholds:
+        # Only step back down once we're clearly below the level we're at
+        if level <= previous:
+            threshold -= TEMP_HYSTERESIS
+        if temp >= threshold:
+            return level
+    return POWER_NORMAL
+
+
+def decide(sample: PowerSample, previous: Optional[Policy] = None) -> Policy:
+    level = thermal_level(sample.temp, previous.level if previous else POWER_NORMAL)
+    policy = Policy(level)
+
+    if level >= POWER_WARM:
+        policy.fps = 20
+        policy.max_jobs = 2
+        policy.reasons.append(f"warm {sample.temp:.1f}C")
+    if level >= POWER_HOT:
+        # Fewer, smaller, cheaper-to-hash chunks keep the SoC below the firmware limit
+        policy.workers = 1
+        policy.chunk_size = COPY_CHUNK_SIZE // 4
+        policy.hash_algo = 'md5'
+        policy.fps = 10
+        policy.max_jobs = 1
+        policy.reasons[-1] = f"hot {sample.temp:.1f}C"
+    if level >= POWER_CRITICAL:
+        policy.fps = 5
+        policy.reasons[-1] = f"critical {sample.temp:.1f}C"
+
+    if sample.undervoltage:
+        # Brownouts corrupt writes; draw less current rather than more speed
+        policy.workers = 1
+        policy.max_jobs = 1
+        policy.reasons.append('undervoltage')
+
+    if sample.on_battery and sample.battery is not None:
+        # Copy throughput is kept (finishing sooner costs less energy); the display pays
+        if sample.battery <= BATT_CRITICAL:
+            policy.fps = min(policy.fps, 5)
+            policy.max_jobs = 1
+            policy.reasons.append(f"battery critical {sample.battery}%")
+        elif sample.battery <= BATT_LOW:
+            policy.fps = min(policy.fps, 10)
+            policy.reasons.append(f"battery low {sample.battery}%")
+    return policy
+
+
+class Governor:
+    def __init__(
+        self,
+        root: str = '/',
+        *,
+        interval: float = POWER_INTERVAL,
+        on_change: Optional[Callable[[Policy, PowerSample], None]] = None,
+    ) -> None:
+        self.root = root
+        self.interval = interval
+        self.on_change: List[Callable[[Policy, PowerSample], None]] = [on_change] if on_change else []
+        self.policy = Policy()
+        self.sample: Optional[PowerSample] = None
+        # Recent decisions, newest last, for the UI and traces
+        self.history: Deque = deque(maxlen=100)
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+
+    def update(self) -> Policy:
+        sample = read_sample(self.root)
+        policy = decide(sample, self.policy)
+        self.sample = sample
+        if policy != self.policy:
+            logger.info(
+                'power policy %s -> %s (%s)',
+                self.policy.to_dict(), policy.to_dict(), ', '.join(policy.reasons) or 'normal',
+            )
+            self.history.append((sample, policy))
+            self.policy = policy
+            for callback in self.on_change:
+                callback(policy, sample)
+        return self.policy
+
+
+    def start(self):
+        # A bad first reading must not keep the app from starting; the defaults stand until the next one
+        try:
+            self.update()
+        except Exception:
+            logger.exception('power sampling failed')
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name='picard-governor', daemon=True)
+        self.thread.start()
+
+
+    def stop(self, timeout: Optional[float] = None):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.update()
+            except Exception:
+                logger.exception('power sampling failed')
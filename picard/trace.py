@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import struct
+import threading
+from queue import Queue
+from typing import List, Dict, Optional, Iterator, Tuple, Any
+from .const import *
+
+
+# A trace is MAGIC followed by records of (type: u8, length: u32, payload).
+# Payloads are fixed structs except file names and JSON events, so a
+# record costs a few dozen bytes and one struct.pack on the hot path.
+MAGIC = b'PICTRC1\n'
+RECORD = struct.Struct('<BI')
+
+REC_FILE = 1
+REC_PHASE = 2
+REC_QUEUE = 3
+REC_STALL = 4
+REC_EVENT = 5
+
+FILE = struct.Struct('<IQ')
+PHASE = struct.Struct('<dIBdQ')
+QUEUE = struct.Struct('<dBI')
+STALL = struct.Struct('<dIBd')
+
+PHASE_SCAN = 0
+PHASE_OPEN = 1
+PHASE_READ = 2
+PHASE_HASH = 3
+PHASE_COMPRESS = 4
+PHASE_WRITE = 5
+PHASE_FSYNC = 6
+PHASE_VERIFY = 7
+PHASE_DELETE = 8
+
+PHASE_NAMES = {
+    PHASE_SCAN: 'scan',
+    PHASE_OPEN: 'open',
+    PHASE_READ: 'read',
+    PHASE_HASH: 'hash',
+    PHASE_COMPRESS: 'compress',
+    PHASE_WRITE: 'write',
+    PHASE_FSYNC: 'fsync',
+    PHASE_VERIFY: 'verify',
+    PHASE_DELETE: 'delete',
+}
+# Phases spent waiting on a card or disk rather than the CPU
+DEVICE_PHASES = {PHASE_OPEN, PHASE_READ, PHASE_WRITE, PHASE_FSYNC, PHASE_VERIFY, PHASE_DELETE}
+CPU_PHASES = {PHASE_HASH, PHASE_COMPRESS}
+
+QUEUE_FILES = 0
+QUEUE_CHUNKS = 1
+
+QUEUE_NAMES = {
+    QUEUE_FILES: 'files',
+    QUEUE_CHUNKS: 'chunks',
+}
+
+
+class Tracer:
+    def __init__(
+        self,
+        path: str,
+        meta: Optional[Dict] = None,
+        *,
+        buffer_size: int = TRACE_BUFFER_SIZE,
+        stall_threshold: float = TRACE_STALL_THRESHOLD,
+    ) -> None:
+        self.path = os.path.expanduser(path)
+        self.buffer_size = buffer_size
+        self.stall_threshold = stall_threshold
+        self.buffer = bytearray(MAGIC)
+        self.lock = threading.Lock()
+        self.file_ids: Dict[str, int] = {}
+        self.closed = False
+
+        # Full buffers are handed to a writer thread so the copy never waits on the trace file
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.file = open(self.path, 'wb')
+        self.pending: Queue = Queue()
+        self.writer = threading.Thread(target=self._write_loop, name='picard-trace', daemon=True)
+        self.writer.start()
+        self.event('start', **(meta or {}))
+
+
+    def __enter__(self) -> 'Tracer':
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+    def _record(self, type: int, payload: bytes):
+        with self.lock:
+            self.buffer += RECORD.pack(type, len(payload))
+            self.buffer += payload
+            if len(self.buffer) >= self.buffer_size:
+                self.pending.put(self.buffer)
+                self.buffer = bytearray()
+
+
+    def _write_loop(self):
+        while True:
+            data = self.pending.get()
+            if data is None:
+                break
+            self.file.write(data)
+
+
+    def file_id(self, path: str, size: int = 0) -> int:
+        with self.lock:
+            if path in self.file_ids:
+                return self.file_ids[path]
+            id = len(self.file_ids)
+            self.file_ids[path] = id
+        self._record(REC_FILE, FILE.pack(id, size) + path.encode('utf-8'))
+        return id
+
+
+    def phase(self, file_id: int, phase: int, start: float, duration: float, nbytes: int = 0):
+        self._record(REC_PHASE, PHASE.pack(start, file_id, phase, duration, nbytes))
+
+
+    def stall(self, file_id: int, phase: int, start: float, duration: float):
+        # Single calls that blocked for long, e.g. a card pausing mid-read
+        if duration >= self.stall_threshold:
+            self._record(REC_STALL, STALL.pack(start, file_id, phase, duration))
+
+
+    def queue(self, queue: int, depth: int):
+        self._record(REC_QUEUE, QUEUE.pack(time.time(), queue, depth))
+
+
+    def event(self, name: str, **data):
+        payload = json.dumps({'name': name, 'time': time.time(), **data}).encode('utf-8')
+        self._record(REC_EVENT, payload)
+
+
+    def close(self):
+        if self.closed:
+            return
+        self.event('end')
+        self.closed = True
+        with self.lock:
+            self.pending.put(self.buffer)
+            self.buffer = bytearray()
+        self.pending.put(None)
+        self.writer.join()
+        self.file.close()
+
+
+class PhaseTimer:
+    # Accumulates time and bytes per phase for one file and emits one
+    # record per phase when done, instead of one per chunk
+    def __init__(self, tracer: Optional[Tracer], file_id: int) -> None:
+        self.tracer = tracer
+        self.file_id = file_id
+        self.start = time.time()
+        self.totals: Dict[int, List[float]] = {}
+
+
+    def add(self, phase: int, started: float, nbytes: int = 0) -> float:
+        now = time.perf_counter()
+        duration = now - started
+        total = self.totals.setdefault(phase, [0.0, 0])
+        total[0] += duration
+        total[1] += nbytes
+        if self.tracer:
+            self.tracer.stall(self.file_id, phase, time.time() - duration, duration)
+        return now
+
+
+    def flush(self):
+        if self.tracer:
+            for phase, (duration, nbytes) in self.totals.items():
+                self.tracer.phase(self.file_id, phase, self.start, duration, nbytes)
+        self.totals = {}
+
+
+def read_trace(path: str) -> Iterator[Tuple[int, Any]]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a picard trace")
+
+    pos = len(MAGIC)
+    while pos + RECORD.size <= len(data):
+        type, length = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        payload = data[pos:pos + length]
+        if len(payload) < length:
+            # Trace cut short by a crash; everything before it is still good
+            break
+        pos += length
+        if type == REC_FILE:
+            id, size = FILE.unpack_from(payload)
+            yield type, (id, size, payload[FILE.size:].decode('utf-8'))
+        elif type == REC_PHASE:
+            yield type, PHASE.unpack(payload)
+        elif type == REC_QUEUE:
+            yield type, QUEUE.unpack(payload)
+        elif type == REC_STALL:
+            yield type, STALL.unpack(payload)
+        elif type == REC_EVENT:
+            yield type, json.loads(payload)
@@ -2,6 +2,8 @@ import pygame
 import math
 from typing import List, Tuple, Optional, Union, TypeVar, Generic
 from .base import State
+from .const import *
+from .layout import LayoutNode, Item
 
 
 class Element(pygame.sprite.Sprite):
@@ -30,6 +32,10 @@ class Element(pygame.sprite.Sprite):
         self._focused = State(False, self.all_states)
         self._focusable = focusable
         self.updated = True
+        self.layout_node: Optional[Item] = None
+        self.drawn_rect: Optional[pygame.Rect] = None
+        # Draw order within a Window, higher is on top
+        self.z = 0
 
         if init_image:
             self.init_image()
@@ -41,7 +47,7 @@ class Element(pygame.sprite.Sprite):
 
     @x.setter
     def x(self, value: int):
-        return self._x.set(value)
+        return self.move(value, self.y)
 
     @property
     def y(self):
@@ -49,7 +55,7 @@ class Element(pygame.sprite.Sprite):
     
     @y.setter
     def y(self, value: int):
-        return self._y.set(value)
+        return self.move(self.x, value)
 
     @property
     def w(self):
@@ -119,6 +125,16 @@ class Element(pygame.sprite.Sprite):
         return False
     
 
+    @property
+    def opaque(self) -> bool:
+        # Opaque elements fully hide whatever is drawn below them
+        return (
+            self.image.get_colorkey() is None
+            and self.image.get_alpha() in [None, 255]
+            and not self.image.get_flags() & pygame.SRCALPHA
+        )
+
+
     def init_image(self):
         self.image = pygame.Surface((self.w, self.h))
         if self.colorkey:
@@ -132,10 +148,21 @@ class Element(pygame.sprite.Sprite):
             return
         
         self.updated = True
+        if self.image.get_size() != (self.w, self.h):
+            self.init_image()
+            return
         self.render_background()
         self.render_opacity()
+        self.commit_states()
+    
+
+    def commit_states(self):
+        # The image now reflects every state, so nothing is pending until the next set()
+        for state in self.all_states:
+            state.changed = False
         
 
+
     def render_background(self):
         if self.background:
             self.image.fill(self._background.get())
@@ -145,6 +172,14 @@ class Element(pygame.sprite.Sprite):
         self.image.set_alpha(self._opacity.get())
 
         
+    def move(self, x: int, y: int):
+        self._x.set(x)
+        self._y.set(y)
+        if self._x.changed or self._y.changed:
+            self.rect.topleft = (self._x.get(), self._y.get())
+            self.updated = True
+
+
     def get_updated_rect(self) -> Union[pygame.Rect, None]:
         if self.updated:
             self.updated = False
@@ -153,6 +188,66 @@ class Element(pygame.sprite.Sprite):
             return None
     
 
+class TextElement(Element):
+    def __init__(
+        self, 
+        x: int, 
+        y: int, 
+        *, 
+        text: Union[str, State], 
+        font: pygame.font.Font,
+        color: Tuple[int] = COLOR_WHITE,
+        antialias: bool = False,
+        colorkey: Union[Tuple[int], None] = None,
+        focusable: bool = False,
+        background: Union[Tuple[int], None] = None, 
+        opacity: Union[int, None] = None,
+    ) -> None:
+        super().__init__(x, y, colorkey=colorkey, focusable=focusable, background=background, opacity=opacity, init_image=False)
+        # Passing a State shares it, so setting it from outside re-renders the text
+        self._text: State = text if isinstance(text, State) else State(text)
+        self.all_states.append(self._text)
+        self._color = State(color, self.all_states)
+        self.font = font
+        self.antialias = antialias
+        self.init_image()
+
+
+    @property
+    def text(self):
+        return self._text.value
+    
+    @text.setter
+    def text(self, value: str):
+        return self._text.set(value)
+
+    @property
+    def color(self):
+        return self._color.value
+    
+    @color.setter
+    def color(self, value: Tuple[int]):
+        return self._color.set(value)
+
+
+    def init_image(self):
+        self.rect = pygame.Rect(self.x, self.y, 0, 0)
+        self.render(True)
+    
+
+    def render(self, force: bool = False):
+        if not force and not (self._text.changed or self._color.changed or self._background.changed or self._opacity.changed):
+            return
+
+        self.updated = True
+        self.image = self.font.render(self._text.get(), self.antialias, self._color.get(), self._background.get())
+        if self.colorkey:
+            self.image.set_colorkey(self.colorkey, pygame.RLEACCEL)
+        self.rect = self.image.get_rect(left=self.x, top=self.y)
+        self.render_opacity()
+        self.commit_states()
+
+
 class ImageElement(Element):
     def __init__(
         self, 
@@ -208,7 +303,9 @@ class ImageElement(Element):
                 self.image = pygame.transform.scale(self.original_image, (w, h))
                 self.rect = self.image.get_rect(left=self.x, top=self.y)
         
+        self.rect.topleft = (self.x, self.y)
         self.render_opacity()
+        self.commit_states()
 
 
 class UIElement(ImageElement):
@@ -321,12 +418,123 @@ class UIElement(ImageElement):
             self.image.blit(interior_surf, (bn[3], bn[0]))
 
         self.render_opacity()
+        self.commit_states()
+
+
+def merge_rects(rects: List[pygame.Rect]) -> List[pygame.Rect]:
+    # Union overlapping rects so no pixel is recomposed twice in one frame
+    merged: List[pygame.Rect] = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        if not rect.w or not rect.h:
+            continue
+        i = 0
+        while i < len(merged):
+            if merged[i].colliderect(rect):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
 
 
 class Window:
     def __init__(
         self, 
-        title: str
+        title: str,
+        rect: Union[pygame.Rect, Tuple[int], None] = None,
+        *,
+        layout: Optional[LayoutNode] = None,
+        background: Tuple[int] = COLOR_BLACK,
     ) -> None:
         self.title = title
+        self.rect = pygame.Rect(rect if rect else (0, 0, SCREEN_W, SCREEN_H))
+        self.background = background
+        # Kept sorted by z; sort is stable so equal z keeps insertion order
         self.elements: List[Element] = []
+        self.layout: Optional[LayoutNode] = None
+        self.layout_items: List[Item] = []
+        self.removed_rects: List[pygame.Rect] = []
+        if layout:
+            self.set_layout(layout)
+    
+
+    def add(self, element: Element, z: Optional[int] = None) -> Element:
+        if z is not None:
+            element.z = z
+        element.updated = True
+        self.elements.append(element)
+        self.elements.sort(key=lambda e: e.z)
+        return element
+    
+
+    def remove(self, element: Element):
+        self.elements.remove(element)
+        if element.drawn_rect:
+            self.removed_rects.append(element.drawn_rect)
+            element.drawn_rect = None
+    
+
+    def set_z(self, element: Element, z: int):
+        element.z = z
+        element.updated = True
+        self.elements.sort(key=lambda e: e.z)
+    
+
+    def set_layout(self, layout: LayoutNode):
+        if self.layout:
+            for item in self.layout_items:
+                self.remove(item.element)
+        self.layout = layout
+        self.layout_items = layout.items()
+        for item in self.layout_items:
+            self.add(item.element)
+        layout.invalidate()
+    
+
+    def update(self):
+        for element in self.elements:
+            element.update()
+            element.render()
+
+        # Only nodes whose element changed size get re-measured and re-arranged
+        if self.layout:
+            for item in self.layout_items:
+                item.sync()
+            self.layout.update(self.rect)
+    
+
+    def draw(self, surface: pygame.Surface, force: bool = False) -> List[pygame.Rect]:
+        # Damage is where changed elements were plus where they are now
+        dirty_rects = self.removed_rects
+        self.removed_rects = []
+        for element in self.elements:
+            if not element.updated and not force:
+                continue
+            if element.drawn_rect:
+                dirty_rects.append(element.drawn_rect)
+            dirty_rects.append(element.rect.copy())
+            element.drawn_rect = element.rect.copy()
+            element.updated = False
+        if force:
+            dirty_rects = [self.rect.copy()]
+        dirty_rects = [rect.clip(self.rect) for rect in merge_rects(dirty_rects)]
+        dirty_rects = [rect for rect in dirty_rects if rect.w and rect.h]
+
+        for rect in dirty_rects:
+            layers = [element for element in self.elements if element.rect.colliderect(rect)]
+
+            # Everything under the topmost opaque layer covering the rect is hidden
+            bottom = 0
+            for i in range(len(layers) - 1, -1, -1):
+                if layers[i].opaque and layers[i].rect.contains(rect):
+                    bottom = i
+                    break
+            else:
+                surface.fill(self.background, rect)
+
+            for element in layers[bottom:]:
+                clip = element.rect.clip(rect)
+                surface.blit(element.image, clip.topleft, clip.move(-element.rect.x, -element.rect.y))
+        return dirty_rects
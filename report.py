@@ -0,0 +1,168 @@
+from picard.trace import (
+    read_trace,
+    REC_FILE, REC_PHASE, REC_QUEUE, REC_STALL, REC_EVENT,
+    PHASE_OPEN, PHASE_READ, PHASE_HASH, PHASE_COMPRESS, PHASE_WRITE, PHASE_FSYNC,
+    PHASE_NAMES, QUEUE_NAMES, DEVICE_PHASES, CPU_PHASES,
+)
+import argparse
+
+
+MB = 1024 * 1024
+HISTOGRAM_BUCKETS = [1, 2, 5, 10, 20, 50]
+COPY_PHASES = {PHASE_OPEN, PHASE_READ, PHASE_HASH, PHASE_COMPRESS, PHASE_WRITE, PHASE_FSYNC}
+
+
+class TraceSummary:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.files = {}
+        self.file_phases = {}
+        self.phases = {}
+        self.stalls = []
+        self.queues = {}
+        self.events = []
+
+        for type, record in read_trace(path):
+            if type == REC_FILE:
+                id, size, name = record
+                self.files[id] = (name, size)
+            elif type == REC_PHASE:
+                start, id, phase, duration, nbytes = record
+                for totals in (self.file_phases.setdefault(id, {}), self.phases):
+                    total = totals.setdefault(phase, [0.0, 0])
+                    total[0] += duration
+                    total[1] += nbytes
+            elif type == REC_QUEUE:
+                t, queue, depth = record
+                self.queues.setdefault(queue, []).append(depth)
+            elif type == REC_STALL:
+                self.stalls.append(record)
+            elif type == REC_EVENT:
+                self.events.append(record)
+
+        times = [event['time'] for event in self.events]
+        self.wall = max(times) - min(times) if times else 0.0
+        self.bytes = sum(size for name, size in self.files.values())
+        self.start = next((e for e in self.events if e['name'] == 'start'), {})
+        self.finish = next((e for e in self.events if e['name'] == 'finish'), {})
+        self.scan = next((e for e in self.events if e['name'] == 'scan'), {})
+        self.policies = [e for e in self.events if e['name'] == 'policy']
+
+
+    def busy(self, phases) -> float:
+        return sum(self.phases[phase][0] for phase in phases if phase in self.phases)
+
+
+    @property
+    def throughput(self) -> float:
+        return self.bytes / self.wall / MB if self.wall else 0.0
+
+
+    def file_time(self, id: int) -> float:
+        return sum(d for phase, (d, n) in self.file_phases.get(id, {}).items() if phase in COPY_PHASES)
+
+
+    def slowest(self, n: int):
+        return sorted(self.files, key=self.file_time, reverse=True)[:n]
+
+
+    def metrics(self):
+        metrics = [
+            ('files', len(self.files)),
+            ('MB', self.bytes / MB),
+            ('wall s', self.wall),
+            ('MB/s', self.throughput),
+            ('scan s', self.scan.get('duration', 0.0)),
+            ('device s', self.busy(DEVICE_PHASES)),
+            ('cpu s', self.busy(CPU_PHASES)),
+            ('stalls', len(self.stalls)),
+        ]
+        metrics += [(f'{PHASE_NAMES[phase]} s', self.phases[phase][0]) for phase in sorted(self.phases)]
+        return metrics
+
+
+def print_summary(summary: TraceSummary, top: int):
+    job = summary.start.get('job', {})
+    print(f"Trace {summary.path}")
+    if job:
+        print(f"  job {job['id']}: {job['src']} -> {job['dest']} (mode {job['mode']}, output {job['output']})")
+    if summary.finish:
+        print(f"  status {summary.finish.get('status')}" + (f": {summary.finish['error']}" if summary.finish.get('error') else ''))
+    print(f"  {len(summary.files)} files, {summary.bytes / MB:.1f} MB in {summary.wall:.1f} s ({summary.throughput:.2f} MB/s)")
+    if summary.scan:
+        print(f"  scan {summary.scan['duration']:.2f} s")
+
+    # Busy time sums across workers, so it can exceed wall time
+    device = summary.busy(DEVICE_PHASES)
+    cpu = summary.busy(CPU_PHASES)
+    total = device + cpu
+    print("\nPhases (busy time across workers)")
+    for phase in sorted(summary.phases):
+        duration, nbytes = summary.phases[phase]
+        rate = f"{nbytes / duration / MB:8.2f} MB/s" if duration and nbytes else ''
+        print(f"  {PHASE_NAMES[phase]:<9}{duration:9.2f} s  {rate}")
+    if total:
+        print(f"  device-limited {device:.2f} s ({device / total:.0%}), cpu-limited {cpu:.2f} s ({cpu / total:.0%})")
+
+    print(f"\nSlowest {top} files")
+    for id in summary.slowest(top):
+        name, size = summary.files[id]
+        duration = summary.file_time(id)
+        rate = size / duration / MB if duration else 0.0
+        worst = max(summary.file_phases.get(id, {0: [0.0, 0]}).items(), key=lambda item: item[1][0])[0]
+        print(f"  {duration:8.2f} s {size / MB:9.1f} MB {rate:7.2f} MB/s  {PHASE_NAMES.get(worst, '?'):<8} {name}")
+
+    print(f"\nStalls ({len(summary.stalls)})")
+    for start, id, phase, duration in sorted(summary.stalls, key=lambda s: s[3], reverse=True)[:top]:
+        print(f"  {duration:8.2f} s in {PHASE_NAMES[phase]:<8} {summary.files.get(id, ('?', 0))[0]}")
+
+    print("\nPer-file throughput")
+    counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+    for id, (name, size) in summary.files.items():
+        duration = summary.file_time(id)
+        if not duration or not size:
+            continue
+        rate = size / duration / MB
+        counts[sum(rate >= bucket for bucket in HISTOGRAM_BUCKETS)] += 1
+    labels = [f"< {HISTOGRAM_BUCKETS[0]}"]
+    labels += [f"{a}-{b}" for a, b in zip(HISTOGRAM_BUCKETS, HISTOGRAM_BUCKETS[1:])]
+    labels += [f">= {HISTOGRAM_BUCKETS[-1]}"]
+    widest = max(counts) or 1
+    for label, count in zip(labels, counts):
+        print(f"  {label:>7} MB/s {count:6} {'#' * round(40 * count / widest)}")
+
+    if summary.queues:
+        print("\nQueue depth")
+        for queue, depths in sorted(summary.queues.items()):
+            print(f"  {QUEUE_NAMES[queue]:<7} avg {sum(depths) / len(depths):.1f}, max {max(depths)}")
+
+    if summary.policies:
+        print("\nPower policy changes")
+        for policy in summary.policies:
+            print(f"  +{policy['time'] - summary.start.get('time', policy['time']):7.1f} s level {policy['level']}, "
+                  f"{policy['workers']} workers, {', '.join(policy['reasons']) or 'normal'}")
+
+
+def print_comparison(a: TraceSummary, b: TraceSummary):
+    print(f"{'':<12}{'A':>12}{'B':>12}{'change':>10}")
+    b_metrics = dict(b.metrics())
+    for name, value in a.metrics():
+        other = b_metrics.pop(name, 0.0)
+        change = f"{(other - value) / value:+.0%}" if value else ''
+        print(f"{name:<12}{value:12.2f}{other:12.2f}{change:>10}")
+    for name, other in b_metrics.items():
+        print(f"{name:<12}{0.0:12.2f}{other:12.2f}")
+    print(f"\nA: {a.path}\nB: {b.path}")
+
+
+parser = argparse.ArgumentParser(description='Summarize a PiCard backup trace')
+parser.add_argument('trace')
+parser.add_argument('--compare', metavar='TRACE', help='compare against a second run')
+parser.add_argument('--top', type=int, default=10)
+args = parser.parse_args()
+
+summary = TraceSummary(args.trace)
+if args.compare:
+    print_comparison(summary, TraceSummary(args.compare))
+else:
+    print_summary(summary, args.top)
@@ -1,13 +1,24 @@
-from picard import PiCardTest, PiCardApp
+from picard import PiCardTest, PiCardApp, FramebufferDisplay
 import argparse
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-D', '--dev', action='store_true')
 parser.add_argument('--fps', type=int, default=30)
-args = parser.parse_args()
+parser.add_argument('--fb', metavar='DEVICE', help='draw straight to a framebuffer such as /dev/fb1 instead of through SDL (no keyboard input; quit with Ctrl+C or SIGTERM)')
+parser.add_argument('--fb-size', metavar='WxH', help='framebuffer size, read from sysfs for a real device; required for a plain file')
+parser.add_argument('--fb-bpp', type=int, choices=[16, 32], help='framebuffer depth, read from sysfs for a real device; required for a plain file')
 
-# picard = PiCardTest(is_dev=args.dev, fps=args.fps)
-# picard.start()
+# Archive compression workers re-import this script, so only the real run starts the app
+if __name__ == '__main__':
+    args = parser.parse_args()
 
-app = PiCardApp(screen_size=(320, 240))
-app.run()
\ No newline at end of file
+    # picard = PiCardTest(is_dev=args.dev, fps=args.fps)
+    # picard.start()
+
+    if args.fb:
+        size = tuple(int(i) for i in args.fb_size.lower().split('x')) if args.fb_size else None
+        display = FramebufferDisplay(args.fb, size, bpp=args.fb_bpp)
+        app = PiCardApp(fps=args.fps, display=display)
+    else:
+        app = PiCardApp(screen_size=(320, 240), fps=args.fps)
+    app.run()